@@ -1,4 +1,6 @@
-from difflib import SequenceMatcher
+import sys
+from mods.handler import SQLITE_FILE
+from mods.journal import SQLiteStorage
 from mods.log_config import get_logger_error
 from mods.logic import (
     ab_printer,
@@ -6,6 +8,8 @@ from mods.logic import (
     contact_adder,
     contact_search,
     contact_selector,
+    contacts_exporter,
+    contacts_importer,
     days_to_birthdays,
     exit_func,
     hello_user,
@@ -13,6 +17,7 @@ from mods.logic import (
     saver,
     show_all_contacts,
 )
+from mods.matcher import CommandMatcher
 from mods.sorter import sort_files
 
 
@@ -30,27 +35,9 @@ def unknown_command(phrase: str) -> str:
     if len(phrase) < 4:
         return f'Unknown command "{phrase}"\n'
     else:
-        result = ""
-        subcomands = phrase.split(" ")
-        for key, value in commands.items():
-            for el in subcomands:
-                if len(el) > 2 and el in key:
-                    if key not in result:
-                        result += f"{key}{value[1]}\n"
-
-            if len(key) >= len(phrase):
-                start = 0
-                end = len(phrase) - 1
-                while True:
-                    if (
-                        SequenceMatcher(a=phrase, b=key[start:end]).ratio() > 0.6
-                        and key not in result
-                    ):
-                        result += f"{key}{value[1]}\n"
-                    start += 1
-                    end += 1
-                    if end > len(key) - 1:
-                        break
+        result = "".join(
+            f"{key}{commands[key][1]}\n" for key in matcher.suggest(phrase)
+        )
 
         if result:
             return f'Unknown command "{phrase}"\nDid you mean:\n{result}'
@@ -80,6 +67,8 @@ commands = {
     "?b": (days_to_birthdays, " -> days to birthgays (short command)"),
     "print all": (ab_printer, " -> printing complete address book"),
     "pa": (ab_printer, " -> printing complete address book (short command)"),
+    "import": (contacts_importer, " -> adds contacts from a .csv or .jsonl file"),
+    "export": (contacts_exporter, " -> saves all contacts to a .csv or .jsonl file"),
     "sort": (sort_files, " -> sort files by category in a selected folder"),
     "so": (
         sort_files,
@@ -87,18 +76,32 @@ commands = {
     ),
 }
 
+matcher = CommandMatcher(commands)
+
 
 def main():
+    # "--sqlite [path]" keeps the Address Book in an SQLite file instead of memory
+    if "--sqlite" in sys.argv[1:]:
+        position = sys.argv.index("--sqlite") + 1
+        path = sys.argv[position] if position < len(sys.argv) else SQLITE_FILE
+        bot.storage = SQLiteStorage(path)
+
     bot.greating()
     print(loader())
     while True:
-        phrase = input('Please enter command or type "help": ').strip()
+        # End of piped input finishes a scripted session
+        try:
+            phrase = input('Please enter command or type "help": ').strip()
+            result = bot.command_handler(phrase, commands)
+        except EOFError:
+            print("\nGoodbye!\n")
+            break
 
-        result = bot.command_handler(phrase, commands)
-        print(result)
         if result == "":
-            unknown_command(phrase)
-        elif result == "Goodbye!\n":
+            print(unknown_command(phrase))
+        else:
+            print(result)
+        if result == "Goodbye!\n":
             break
 
 
@@ -0,0 +1,68 @@
+import os
+import random
+import string
+import sys
+from difflib import SequenceMatcher
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods.matcher import CommandMatcher
+
+
+# unknown_command as it was before the trigram matcher
+def sliding_window(phrase: str, commands: dict) -> str:
+    result = ""
+    subcomands = phrase.split(" ")
+    for key, value in commands.items():
+        for el in subcomands:
+            if len(el) > 2 and el in key:
+                if key not in result:
+                    result += f"{key}{value[1]}\n"
+
+        if len(key) >= len(phrase):
+            start = 0
+            end = len(phrase) - 1
+            while True:
+                if (
+                    SequenceMatcher(a=phrase, b=key[start:end]).ratio() > 0.6
+                    and key not in result
+                ):
+                    result += f"{key}{value[1]}\n"
+                start += 1
+                end += 1
+                if end > len(key) - 1:
+                    break
+    return result
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rng = random.Random(1)
+    commands = {}
+    while len(commands) < size:
+        key = " ".join(random_word(rng) for _ in range(rng.randint(1, 3)))
+        commands[key] = (None, " -> generated command")
+    phrases = [key[:-1] + "x" for key in rng.sample(list(commands), 20)]
+
+    start = perf_counter()
+    matcher = CommandMatcher(commands)
+    build = perf_counter() - start
+
+    start = perf_counter()
+    for phrase in phrases:
+        sliding_window(phrase, commands)
+    old = (perf_counter() - start) / len(phrases)
+
+    start = perf_counter()
+    for phrase in phrases:
+        matcher.suggest(phrase)
+    new = (perf_counter() - start) / len(phrases)
+
+    print(f"{size} commands, index built in {build * 1000:.2f} ms")
+    print(f"SequenceMatcher sliding window: {old * 1_000_000:>10.1f} us per lookup")
+    print(f"Trigram matcher:                {new * 1_000_000:>10.1f} us per lookup")
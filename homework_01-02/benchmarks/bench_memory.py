@@ -0,0 +1,48 @@
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods.fields import Address, Birthday, Email, Name, Note, Phone, Record
+from mods.handler import AddressBook
+
+
+def make_record(i: int) -> Record:
+    record = Record(Name(f"contact{i}"))
+    record.set_address(Address(f"{i} Main street"))
+    record.set_phone(Phone(f"+38(099){i:07d}"))
+    record.set_email(Email(f"contact{i}@mail.com"))
+    birthday = Birthday(f"{1960 + i % 40}-{1 + i % 12:02d}-{1 + i % 28:02d}")
+    birthday.validator()
+    record.set_birthday(birthday)
+    record.set_note(Note(f"note {i}"))
+    return record
+
+
+def measure(size: int, build) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(size)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / size
+
+
+def records_only(size: int) -> list[Record]:
+    return [make_record(i) for i in range(size)]
+
+
+def full_book(size: int) -> AddressBook:
+    book = AddressBook()
+    for i in range(size):
+        book.add_record(make_record(i))
+    return book
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Bytes per contact over {size} contacts")
+    print(f"Records only:      {measure(size, records_only):>8.0f}")
+    print(f"Indexed book:      {measure(size, full_book):>8.0f}")
@@ -0,0 +1,78 @@
+import os
+import pickle
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods.fields import Name, Phone, Record
+from mods.handler import AddressBook
+from mods.journal import Journal
+
+
+CHANGED = 100
+
+
+def make_book(size: int) -> AddressBook:
+    book = AddressBook()
+    for i in range(size):
+        record = Record(Name(f"contact{i}"))
+        record.set_phone(Phone(f"+38(099){i:07d}"))
+        book.add_record(record)
+    book.reset_changes()
+    return book
+
+
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+def pickle_save(book: AddressBook, path: str) -> None:
+    with open(path, "wb") as file:
+        pickle.dump(book, file)
+
+
+def pickle_load(path: str) -> AddressBook:
+    with open(path, "rb") as file:
+        return pickle.load(file)
+
+
+def bench(size: int, folder: str) -> None:
+    book = make_book(size)
+    path = os.path.join(folder, f"pickle_{size}.dat")
+    journal = Journal(
+        os.path.join(folder, f"snapshot_{size}.dat"),
+        os.path.join(folder, f"journal_{size}.log"),
+    )
+    journal.compact(book)
+
+    for i in range(CHANGED):
+        book.records[f"contact{i}"].set_phone(Phone("+38(050)0000000"))
+
+    pickle_save_time, _ = timed(pickle_save, book, path)
+    pickle_load_time, _ = timed(pickle_load, path)
+    journal_save_time, _ = timed(journal.save, book)
+    journal_load_time, loaded = timed(journal.load)
+    assert len(loaded.records) == size
+
+    print(
+        "{:>9} | {:>11.4f} | {:>11.4f} | {:>12.4f} | {:>12.4f}".format(
+            size,
+            pickle_save_time,
+            pickle_load_time,
+            journal_save_time,
+            journal_load_time,
+        )
+    )
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"Save after changing {CHANGED} records, times in seconds")
+    print("  records | pickle save | pickle load | journal save | journal load")
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            bench(size, folder)
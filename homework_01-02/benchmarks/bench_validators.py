@@ -0,0 +1,60 @@
+import os
+import re
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mods.fields import Email, Phone
+
+
+# Validator as it was before patterns were compiled, logic.py called it twice per input
+def old_validator(value: str, pattern: str) -> bool | None:
+    if value == "":
+        return False
+    elif re.fullmatch(pattern, value):
+        return True
+
+
+def string_pattern(values: list[str], pattern: str) -> list[bool | None]:
+    result = []
+    for value in values:
+        old_validator(value, pattern)
+        result.append(old_validator(value, pattern))
+    return result
+
+
+def per_instance(values: list[str], field) -> list[bool | None]:
+    result = []
+    for value in values:
+        item = field(value)
+        item.validator()
+        result.append(item.validator())
+    return result
+
+
+def timed(func, *args) -> tuple[float, list]:
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    phones = [
+        f"+38(0{i % 100:02d}){i:07d}" if i % 10 else f"38-0{i:07d}" for i in range(size)
+    ]
+    emails = [f"user{i}@mail.com" if i % 10 else f"{i}@mail" for i in range(size)]
+
+    print(f"Validating {size} values, times in seconds")
+    print("field | re.fullmatch(str) x2 | validator() x2 | validate_many()")
+    for field, values in ((Phone, phones), (Email, emails)):
+        old_time, old = timed(string_pattern, values, field.pattern.pattern)
+        instance_time, instance = timed(per_instance, values, field)
+        bulk_time, bulk = timed(field.validate_many, values)
+        assert old == instance == bulk
+        print(
+            "{:<5} | {:>20.3f} | {:>14.3f} | {:>15.3f}".format(
+                field.__name__, old_time, instance_time, bulk_time
+            )
+        )
@@ -1,5 +1,6 @@
 import re
 from abc import ABC, abstractclassmethod
+from collections.abc import Iterable
 from datetime import datetime
 from mods.log_config import get_logger_error
 
@@ -8,35 +9,69 @@ logger = get_logger_error(__name__)
 
 
 class Field(ABC):
+    __slots__ = ("value", "checked")
+
+    pattern = None
+
+    # Backups made before fields were slotted keep their values in a __dict__
+    def __setstate__(self, state: dict | tuple) -> None:
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+        for key, value in state.items():
+            setattr(self, key, value)
+
     @abstractclassmethod
     def __str__(self) -> str:
         pass
 
     @abstractclassmethod
-    def validator(self) -> bool:
+    def check(self) -> bool:
         pass
 
+    # Result of the check is computed once per field, the unset slot means "not checked yet"
+    def validator(self) -> bool:
+        try:
+            return self.checked
+        except AttributeError:
+            self.checked = self.check()
+            return self.checked
+
+    # Same results as calling validator() on every value, without creating fields when possible
+    @classmethod
+    def validate_many(cls, values: Iterable[str]) -> list[bool | None]:
+        if cls.pattern is None:
+            return [cls(value).validator() for value in values]
+        fullmatch = cls.pattern.fullmatch
+        return [
+            (True if fullmatch(value) else None) if value != "" else False
+            for value in values
+        ]
+
 
 class Address(Field):
+    __slots__ = ()
+
     def __init__(self, address: str) -> None:
         self.value = address
 
     def __str__(self) -> str:
         return self.value
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
 
 
 class Birthday(Field):
+    __slots__ = ()
+
     def __init__(self, birthday: str) -> None:
         self.value = birthday
 
     def __str__(self) -> str:
         return str(self.value)
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
         try:
@@ -50,58 +85,83 @@ class Birthday(Field):
 
 
 class Email(Field):
+    __slots__ = ()
+
+    pattern = re.compile(r"[a-zA-Z]{1}[\w\.]+@[a-zA-Z]+\.[a-zA-Z]{2,3}")
+
     def __init__(self, email: str) -> None:
         self.value = email
 
     def __str__(self) -> str:
         return self.value
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
-        if re.fullmatch(r"[a-zA-Z]{1}[\w\.]+@[a-zA-Z]+\.[a-zA-Z]{2,3}", self.value):
+        if self.pattern.fullmatch(self.value):
             return True
 
 
 class Name(Field):
+    __slots__ = ()
+
     def __init__(self, name: str) -> None:
         self.value = name
 
     def __str__(self) -> str:
         return self.value
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
 
 
 class Note(Field):
+    __slots__ = ()
+
     def __init__(self, note: str) -> None:
         self.value = note
 
     def __str__(self) -> str:
         return self.value
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
 
 
 class Phone(Field):
+    __slots__ = ()
+
+    pattern = re.compile(r"\+[\d]{2}\([\d]{3}\)[\d]{7}")
+
     def __init__(self, phone: str) -> None:
         self.value = phone
 
     def __str__(self) -> str:
         return self.value
 
-    def validator(self) -> bool:
+    def check(self) -> bool:
         if self.value == "":
             return False
-        elif re.fullmatch(r"\+[\d]{2}\([\d]{3}\)[\d]{7}", self.value):
+        elif self.pattern.fullmatch(self.value):
             return True
 
 
 class Record:
+    __slots__ = (
+        "name",
+        "address",
+        "phones",
+        "email",
+        "birthday",
+        "notes",
+        "book",
+        "row",
+        "rendered",
+        "__weakref__",
+    )
+
     def __init__(
         self,
         name: Name,
@@ -113,40 +173,62 @@ class Record:
     ):
         self.name = name
         self.address = address
-        self.phones = []
+        self.phones = ()
         self.email = email
         self.birthday = birthday
-        self.notes = []
+        self.notes = ()
+        self.book = None
+        self.row = None
+        self.rendered = None
+
+    # Drops the cached text and keeps indexes of the Address Book holding this record up to date
+    def changed(self) -> None:
+        self.rendered = None
+        if self.book is not None:
+            self.book.reindex_record(self)
 
     def set_name(self, name: Name):
         self.name = name
+        self.changed()
 
     def set_address(self, address: Address | None):
         self.address = address
+        self.changed()
 
     def set_email(self, value: Email | None):
         self.email = value
+        self.changed()
 
     def set_birthday(self, value: Birthday | None):
         self.birthday = value
+        self.changed()
 
+    # Phones and notes share an empty tuple until the first item is added
     def set_phone(self, phone: Phone | None):
         if phone == None:
-            self.phones.clear()
-        else:
+            self.phones = ()
+        elif self.phones:
             self.phones.append(phone)
+        else:
+            self.phones = [phone]
+        self.changed()
 
     def set_note(self, note: Note | None):
         if note == None:
-            self.phones.clear()
-        else:
+            self.notes = ()
+        elif self.notes:
             self.notes.append(note)
+        else:
+            self.notes = [note]
+        self.changed()
 
     def erase_listed_items(self, listed_item: list[Field], index: int):
         del listed_item[index - 1]
+        self.changed()
 
     def modify_listed_item(self, listed_item: list[Field], index: int, value: str):
         listed_item[index - 1] = value
+        self.changed()
 
     def show_listed_items(self, listed_item: list[Field]) -> str:
         if listed_item:
@@ -157,8 +239,27 @@ class Record:
             result = None
         return result
 
+    # The Address Book is not stored with a record, it re-attaches itself on load
+    def __getstate__(self) -> dict:
+        state = {
+            slot: getattr(self, slot)
+            for slot in self.__slots__
+            if slot != "__weakref__"
+        }
+        state["book"] = None
+        state["row"] = None
+        state["rendered"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        for slot in self.__slots__:
+            if slot != "__weakref__":
+                setattr(self, slot, state.get(slot))
+
     def __str__(self) -> str:
-        return f"Name:     {self.name}\nAddress:  {self.address}\nPhones:   {self.show_listed_items(self.phones)}\nEmail:    {self.email}\nBirthday: {self.birthday}\nNotes:    {self.show_listed_items(self.notes)}\n"
+        if self.rendered is None:
+            self.rendered = f"Name:     {self.name}\nAddress:  {self.address}\nPhones:   {self.show_listed_items(self.phones)}\nEmail:    {self.email}\nBirthday: {self.birthday}\nNotes:    {self.show_listed_items(self.notes)}\n"
+        return self.rendered
 
     def __getitem__(self) -> str:
         return f"{self.name} {self.address} {self.show_listed_items(self.phones)} {self.email} {self.birthday} {self.show_listed_items(self.notes)}"
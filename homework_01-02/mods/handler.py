@@ -1,36 +1,226 @@
+import pickle
+import sqlite3
 from abc import ABC, abstractclassmethod
-from collections import UserDict
+from bisect import bisect_left, insort
+from collections import OrderedDict, UserDict, defaultdict, deque
+from collections.abc import Callable, Iterator, MutableMapping
 from copy import deepcopy
-from mods.fields import Record, Field
+from datetime import date, timedelta
+from itertools import count
+from weakref import WeakValueDictionary
+from mods.fields import Record
+
+
+GRAM_SIZE = 3
+PAGE_SIZE = 100
+SQLITE_CACHE_SIZE = 10_000
+SQLITE_FILE = "backup.sqlite"
+
+
+# Inclusive (month, day) ranges covering the next given number of days,
+# none for a negative number
+def birthday_ranges(
+    days: int, today: date | None = None
+) -> list[tuple[tuple[int, int], tuple[int, int]]]:
+    if days < 0:
+        return []
+    if today is None:
+        today = date.today()
+    if days >= 365:
+        return [((1, 1), (12, 31))]
+
+    end = today + timedelta(days=days)
+    start_key = (today.month, today.day)
+    end_key = (end.month, end.day)
+    if end.year == today.year:
+        return [(start_key, end_key)]
+    return [(start_key, (12, 31)), ((1, 1), end_key)]
 
 
 class AddressBook(UserDict):
     def __init__(self, record: Record | None = None) -> None:
         self.records = {}
+        self.build_indexes()
+        self.reset_changes()
         if record is not None:
             self.add_record(record)
 
     def add_record(self, record: Record) -> None:
         self.records[record.name.value] = record
+        record.book = self
+        self.index_record(record)
+        self.changed_records.add(record)
+
+    # Same as add_record for a batch, every n-gram posting grows once and the
+    # birthday index is sorted once instead of an insort per record
+    def add_records(self, records: list[Record]) -> None:
+        postings = defaultdict(list)
+        birthdays = []
+        for record in records:
+            self.records[record.name.value] = record
+            record.book = self
+            text = record.__getitem__().lower()
+            self.search_texts[record] = text
+            self.search_order.setdefault(record, next(self.search_counter))
+            for gram in self.grams(text):
+                postings[gram].append(record)
+            key = self.birthday_key(record)
+            if key is not None:
+                self.birthday_keys[record] = key
+                birthdays.append(key + (record,))
+            self.changed_records.add(record)
+
+        for gram, found in postings.items():
+            posting = self.search_index.get(gram)
+            if posting is None:
+                self.search_index[gram] = set(found)
+            else:
+                posting.update(found)
+        if birthdays:
+            self.birthday_index.extend(birthdays)
+            self.birthday_index.sort()
 
     def erase_record(self, key: str) -> None:
-        del self.records[key]
-
-    def iterator(self, quantity_to_show: int, listed_items: list[Field]) -> str:
-        counter = 0
-        result = f"\nPrinting {quantity_to_show} contacts"
-        for item, record in listed_items.items():
-            result += f"\n{str(record)}"
-            counter += 1
-            if counter >= quantity_to_show:
-                yield result
-                counter = 0
-                result = f"\nPrinting next {quantity_to_show} contacts"
+        record = self.records.pop(key)
+        self.unindex_record(record)
+        self.search_order.pop(record, None)
+        record.book = None
+        self.changed_records.discard(record)
+        self.erased_keys.add(key)
+
+    def rename_record(self, old_key: str, new_key: str) -> None:
+        record = self.records.pop(old_key)
+        self.records[new_key] = record
+        self.changed_records.add(record)
+        self.erased_keys.add(old_key)
+
+    # Changes since the last save, consumed by the journal
+    def reset_changes(self) -> None:
+        self.changed_records = set()
+        self.erased_keys = set()
+
+    # Secondary indexes: n-grams of the searchable text and (month, day) of birthdays,
+    # search results come in the order the records were added
+    def build_indexes(self) -> None:
+        self.search_index = {}
+        self.search_texts = {}
+        self.search_order = {}
+        self.search_counter = count()
+        self.birthday_index = []
+        self.birthday_keys = {}
+        self.birthday_counter = count()
+        for record in self.records.values():
+            record.book = self
+            self.index_record(record)
+
+    def index_record(self, record: Record) -> None:
+        text = record.__getitem__().lower()
+        self.search_texts[record] = text
+        self.search_order.setdefault(record, next(self.search_counter))
+        for gram in self.grams(text):
+            self.search_index.setdefault(gram, set()).add(record)
+
+        key = self.birthday_key(record)
+        if key is not None:
+            self.birthday_keys[record] = key
+            insort(self.birthday_index, key + (record,))
+
+    # (month, day, counter), the counter keeps keys unique so records are never compared
+    def birthday_key(self, record: Record) -> tuple[int, int, int] | None:
+        if record.birthday is not None and isinstance(record.birthday.value, date):
+            dob = record.birthday.value
+            return (dob.month, dob.day, next(self.birthday_counter))
+        return None
+
+    def unindex_record(self, record: Record) -> None:
+        text = self.search_texts.pop(record, None)
+        if text is not None:
+            for gram in self.grams(text):
+                posting = self.search_index[gram]
+                posting.discard(record)
+                if not posting:
+                    del self.search_index[gram]
+
+        key = self.birthday_keys.pop(record, None)
+        if key is not None:
+            del self.birthday_index[bisect_left(self.birthday_index, key)]
+
+    def reindex_record(self, record: Record) -> None:
+        self.unindex_record(record)
+        self.index_record(record)
+        self.changed_records.add(record)
+
+    @staticmethod
+    def grams(text: str) -> set[str]:
+        return {text[i : i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+    def search(self, inquiry: str) -> list[Record]:
+        inquiry = inquiry.lower()
+        if len(inquiry) < GRAM_SIZE:
+            found = [
+                record for record, text in self.search_texts.items() if inquiry in text
+            ]
+            return sorted(found, key=self.search_order.__getitem__)
+
+        postings = []
+        for gram in self.grams(inquiry):
+            posting = self.search_index.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        candidates = postings[0].intersection(*postings[1:])
+        found = [
+            record for record in candidates if inquiry in self.search_texts[record]
+        ]
+        return sorted(found, key=self.search_order.__getitem__)
+
+    def upcoming_birthdays(self, days: int, today: date | None = None) -> list[Record]:
+        result = []
+        for low, high in birthday_ranges(days, today):
+            left = bisect_left(self.birthday_index, low)
+            right = bisect_left(self.birthday_index, (high[0], high[1] + 1))
+            result.extend(entry[-1] for entry in self.birthday_index[left:right])
+        return result
+
+    def iterator(
+        self, quantity_to_show: int, listed_items: dict[str, Record]
+    ) -> Iterator[str]:
+        header = f"\nPrinting {quantity_to_show} contacts"
+        page = [header]
+        for record in listed_items.values():
+            page.append(str(record))
+            if len(page) > quantity_to_show:
+                yield "\n".join(page)
+                header = f"\nPrinting next {quantity_to_show} contacts"
+                page = [header]
+        if len(page) > 1:
+            yield "\n".join(page)
+
+    # Pages of rendered records, built only when requested
+    def render(
+        self, page_size: int = PAGE_SIZE, with_keys: bool = False
+    ) -> Iterator[str]:
+        page = []
+        for key, record in self.records.items():
+            page.append(f"Key:      {key}\n{record}" if with_keys else str(record))
+            if len(page) >= page_size:
+                yield "\n".join(page)
+                page = []
+        if page:
+            yield "\n".join(page)
 
     def __str__(self) -> str:
-        return "\n".join(
-            f"Key:      {name}\n{record}" for name, record in self.records.items()
-        )
+        return "\n".join(self.render(with_keys=True))
+
+    def __getstate__(self) -> dict:
+        return {"records": self.records}
+
+    def __setstate__(self, state: dict) -> None:
+        self.records = state["records"]
+        self.build_indexes()
+        self.reset_changes()
 
     def __deepcopy__(self, memodict={}):
         copy_ab = AddressBook(self, self.records)
@@ -40,6 +230,209 @@ class AddressBook(UserDict):
         return copy_ab
 
 
+# Lazily loaded view of the contacts table, behaves like the records dict of AddressBook
+class SQLiteRecords(MutableMapping):
+    def __init__(self, book: "SQLiteAddressBook") -> None:
+        self.book = book
+
+    def __getitem__(self, key: str) -> Record:
+        row = self.book.connection.execute(
+            "SELECT id, data FROM contacts WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self.book.load_record(*row)
+
+    def __setitem__(self, key: str, record: Record) -> None:
+        if key in self:
+            self.book.erase_record(key)
+        self.book.insert_record(key, record)
+
+    def __delitem__(self, key: str) -> None:
+        self.book.erase_record(key)
+
+    def __contains__(self, key: object) -> bool:
+        return (
+            self.book.connection.execute(
+                "SELECT 1 FROM contacts WHERE key = ?", (key,)
+            ).fetchone()
+            is not None
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        for (key,) in self.book.connection.execute(
+            "SELECT key FROM contacts ORDER BY id"
+        ).fetchall():
+            yield key
+
+    def __len__(self) -> int:
+        return self.book.connection.execute("SELECT count(*) FROM contacts").fetchone()[
+            0
+        ]
+
+    def items(self) -> Iterator[tuple[str, Record]]:
+        cursor = self.book.connection.execute(
+            "SELECT key, id, data FROM contacts ORDER BY id"
+        )
+        while rows := cursor.fetchmany(PAGE_SIZE):
+            for key, row, data in rows:
+                yield key, self.book.load_record(row, data)
+
+    def values(self) -> Iterator[Record]:
+        for key, record in self.items():
+            yield record
+
+
+# Address Book kept in an SQLite file, FTS5 trigram table serves search and an
+# indexed month*100+day column serves birthdays, records are loaded on demand
+class SQLiteAddressBook(AddressBook):
+    def __init__(self, path: str = SQLITE_FILE) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS contacts (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                data BLOB NOT NULL,
+                birthday_day INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS contacts_birthday ON contacts (birthday_day);
+            CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts
+                USING fts5(text, tokenize = 'trigram');
+            """
+        )
+        self.records = SQLiteRecords(self)
+        self.loaded = OrderedDict()
+        self.live = WeakValueDictionary()
+        self.reset_changes()
+
+    # Keeps one object per contact while anything holds it, the recently used
+    # ones stay cached. Records know their row id, so mutators update the
+    # right row whatever their name is
+    def load_record(self, row: int, data: bytes) -> Record:
+        record = self.live.get(row)
+        if record is None:
+            record = pickle.loads(data)
+            record.book = self
+            record.row = row
+            self.live[row] = record
+        self.remember(record)
+        return record
+
+    def remember(self, record: Record) -> None:
+        self.loaded[record.row] = record
+        self.loaded.move_to_end(record.row)
+        if len(self.loaded) > SQLITE_CACHE_SIZE:
+            self.loaded.popitem(last=False)
+
+    def forget(self, row: int) -> Record | None:
+        self.loaded.pop(row, None)
+        return self.live.pop(row, None)
+
+    def row_id(self, key: str) -> int:
+        row = self.connection.execute(
+            "SELECT id FROM contacts WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return row[0]
+
+    @staticmethod
+    def row_values(record: Record) -> tuple[bytes, int | None, str]:
+        birthday_day = None
+        if record.birthday is not None and isinstance(record.birthday.value, date):
+            birthday_day = record.birthday.value.month * 100 + record.birthday.value.day
+        return pickle.dumps(record), birthday_day, record.__getitem__().lower()
+
+    def insert_record(self, key: str, record: Record) -> None:
+        data, birthday_day, text = self.row_values(record)
+        cursor = self.connection.execute(
+            "INSERT INTO contacts (key, data, birthday_day) VALUES (?, ?, ?)",
+            (key, data, birthday_day),
+        )
+        self.connection.execute(
+            "INSERT INTO contacts_fts (rowid, text) VALUES (?, ?)",
+            (cursor.lastrowid, text),
+        )
+        record.book = self
+        record.row = cursor.lastrowid
+        self.live[record.row] = record
+        self.remember(record)
+
+    def add_record(self, record: Record) -> None:
+        self.records[record.name.value] = record
+
+    def add_records(self, records: list[Record]) -> None:
+        for record in records:
+            self.add_record(record)
+
+    def erase_record(self, key: str) -> None:
+        row = self.row_id(key)
+        self.connection.execute("DELETE FROM contacts WHERE id = ?", (row,))
+        self.connection.execute("DELETE FROM contacts_fts WHERE rowid = ?", (row,))
+        record = self.forget(row)
+        if record is not None:
+            record.book = None
+            record.row = None
+
+    # The stored record is rewritten as well, so it carries the new name
+    def rename_record(self, old_key: str, new_key: str) -> None:
+        row = self.row_id(old_key)
+        self.connection.execute(
+            "UPDATE contacts SET key = ? WHERE id = ?", (new_key, row)
+        )
+        record = self.live.get(row)
+        if record is not None:
+            self.reindex_record(record)
+
+    def build_indexes(self) -> None:
+        pass
+
+    def reindex_record(self, record: Record) -> None:
+        data, birthday_day, text = self.row_values(record)
+        cursor = self.connection.execute(
+            "UPDATE contacts SET data = ?, birthday_day = ? WHERE id = ?",
+            (data, birthday_day, record.row),
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(record.name.value)
+        self.connection.execute(
+            "UPDATE contacts_fts SET text = ? WHERE rowid = ?", (text, record.row)
+        )
+
+    def search(self, inquiry: str) -> list[Record]:
+        inquiry = inquiry.lower()
+        if len(inquiry) < GRAM_SIZE:
+            condition, argument = "instr(f.text, ?) > 0", inquiry
+        else:
+            condition = "contacts_fts MATCH ?"
+            argument = '"{}"'.format(inquiry.replace('"', '""'))
+        rows = self.connection.execute(
+            "SELECT c.id, c.data FROM contacts_fts AS f "
+            f"JOIN contacts AS c ON c.id = f.rowid WHERE {condition} ORDER BY c.id",
+            (argument,),
+        ).fetchall()
+        return [self.load_record(row, data) for row, data in rows]
+
+    def upcoming_birthdays(self, days: int, today: date | None = None) -> list[Record]:
+        result = []
+        for low, high in birthday_ranges(days, today):
+            rows = self.connection.execute(
+                "SELECT id, data FROM contacts WHERE birthday_day BETWEEN ? AND ? "
+                "ORDER BY birthday_day, id",
+                (low[0] * 100 + low[1], high[0] * 100 + high[1]),
+            ).fetchall()
+            result.extend(self.load_record(row, data) for row, data in rows)
+        return result
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def __getstate__(self) -> dict:
+        raise TypeError("SQLiteAddressBook is stored in its database file")
+
+
 class Handler(ABC):
     @abstractclassmethod
     def command_handler(self) -> str:
@@ -47,21 +440,54 @@ class Handler(ABC):
 
 
 class Bot(Handler):
-    def __init__(self):
+    def __init__(self, storage=None):
         self.book = AddressBook()
+        self.storage = storage
+        self.dispatch = {}
+        self.dispatch_source = None
+        self.max_words = 1
+        self.pending = deque()
+
+    # Normalized command names (short forms included) mapped straight to their handlers
+    def build_dispatch(self, commands: dict) -> None:
+        self.dispatch = {
+            " ".join(key.lower().split()): value[0] for key, value in commands.items()
+        }
+        self.max_words = max((len(key.split()) for key in self.dispatch), default=1)
+        self.dispatch_source = commands
+
+    # Longest command at the start of the phrase, the rest are inline arguments
+    def resolve(self, phrase: str) -> tuple[Callable | None, str]:
+        words = phrase.split()
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            handler = self.dispatch.get(" ".join(words[:size]).lower())
+            if handler is not None:
+                return handler, " ".join(words[size:])
+        return None, ""
 
     def command_handler(self, phrase: str, commands: dict):
-        command = None
-        for key in commands:
-            if phrase.lower() == key:
-                command = key
-                break
-        if command is None:
-            result = ""
-        else:
-            handler = commands.get(command)[0]
-            result = handler()
-        return result
+        if commands is not self.dispatch_source:
+            self.build_dispatch(commands)
+        handler, arguments = self.resolve(phrase)
+        if handler is None:
+            return ""
+
+        if arguments:
+            self.pending.extend(answer.strip() for answer in arguments.split(";"))
+        # A malformed answer ends the command, not the session
+        try:
+            return handler()
+        except ValueError as error:
+            return f"\nWrong input: {error}\n"
+        finally:
+            self.pending.clear()
+
+    # Inline arguments answer the prompts of a command before the user is asked,
+    # confirmations with inline=False are always asked
+    def ask(self, prompt: str, inline: bool = True) -> str:
+        if self.pending and inline:
+            return self.pending.popleft()
+        return input(prompt)
 
     def greating(self):
         print("\nHello, I'm your you personal assistant! Are you ready to rock?")
@@ -0,0 +1,124 @@
+import os
+import pickle
+from mods.handler import SQLITE_FILE, AddressBook, SQLiteAddressBook
+from mods.log_config import get_logger_error
+
+
+logger = get_logger_error(__name__)
+
+SNAPSHOT_FILE = "backup.dat"
+JOURNAL_FILE = "backup.journal"
+
+
+# Snapshot of the whole Address Book plus an append-only log of record changes,
+# a save writes only the changed records, a load replays the log over the snapshot
+class Journal:
+    def __init__(
+        self,
+        snapshot: str = SNAPSHOT_FILE,
+        journal: str = JOURNAL_FILE,
+        compact_ratio: float = 0.5,
+    ) -> None:
+        self.snapshot = snapshot
+        self.journal = journal
+        self.compact_ratio = compact_ratio
+
+    @property
+    def location(self) -> str:
+        return self.snapshot
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot) or os.path.exists(self.journal)
+
+    def load(self) -> AddressBook:
+        if not self.exists():
+            raise FileNotFoundError(self.snapshot)
+
+        if os.path.exists(self.snapshot):
+            with open(self.snapshot, "rb") as file:
+                book = pickle.load(file)
+        else:
+            book = AddressBook()
+
+        for entry in self.replay():
+            self.apply(book, entry)
+        book.reset_changes()
+        return book
+
+    def replay(self):
+        if not os.path.exists(self.journal):
+            return
+        with open(self.journal, "rb") as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, AttributeError, ValueError):
+                    logger.error("Truncated journal tail skipped")
+                    break
+
+    @staticmethod
+    def apply(book: AddressBook, entry: tuple) -> None:
+        operation, key = entry[0], entry[1]
+        if key in book.records:
+            book.erase_record(key)
+        if operation == "put":
+            book.add_record(entry[2])
+
+    def save(self, book: AddressBook) -> int:
+        if not os.path.exists(self.snapshot):
+            return self.compact(book)
+
+        entries = [("erase", key) for key in book.erased_keys]
+        entries.extend(
+            ("put", record.name.value, record) for record in book.changed_records
+        )
+        if entries:
+            with open(self.journal, "ab") as file:
+                for entry in entries:
+                    pickle.dump(entry, file, pickle.HIGHEST_PROTOCOL)
+                file.flush()
+                os.fsync(file.fileno())
+        book.reset_changes()
+
+        if entries and os.path.getsize(self.journal) > (
+            os.path.getsize(self.snapshot) * self.compact_ratio
+        ):
+            self.compact(book)
+        return len(entries)
+
+    def compact(self, book: AddressBook) -> int:
+        temp = f"{self.snapshot}.tmp"
+        with open(temp, "wb") as file:
+            pickle.dump(book, file, pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.snapshot)
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+        book.reset_changes()
+        return len(book.records)
+
+
+# Same interface as Journal for the SQLite backend, the database file is the storage
+class SQLiteStorage:
+    def __init__(self, path: str = SQLITE_FILE) -> None:
+        self.path = path
+        self.book = None
+
+    @property
+    def location(self) -> str:
+        return self.path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> SQLiteAddressBook:
+        if self.book is None:
+            self.book = SQLiteAddressBook(self.path)
+        return self.book
+
+    def save(self, book: SQLiteAddressBook) -> int:
+        book.commit()
+        return len(book.records)
@@ -1,23 +1,26 @@
-import pickle
-from datetime import datetime
+import sys
 from mods.fields import Address, Birthday, Email, Name, Note, Phone, Record
 from mods.handler import Bot
+from mods.journal import Journal
 from mods.log_config import get_logger_error
+from mods.transfer import export_contacts, import_contacts
 
 
-bot = Bot()
+bot = Bot(Journal())
 
 logger = get_logger_error(__name__)
 
 
 def ab_printer() -> str:
     print("Printing all records:\n")
-    return bot.book
+    for page in bot.book.render(with_keys=True):
+        sys.stdout.write(f"{page}\n")
+    return "\nEnd of address book\n"
 
 
 # What exactly to do with address
 def address_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove Address, 1 - Replace Address, or press Enter to skip: "
     )
     if choice == "0":
@@ -30,7 +33,7 @@ def address_handler(record: Record):
 
 
 def address_setter(record: Record) -> None:
-    address = Address(input("Enter address or press Enter to skip: "))
+    address = Address(bot.ask("Enter address or press Enter to skip: "))
     if address.validator() != False:
         record.set_address(address)
         print(f'\nAddress "{address}" set\n')
@@ -40,7 +43,7 @@ def address_setter(record: Record) -> None:
 
 # What exactly to do with birthday
 def birthday_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove Birthday, 1 - Replace Birthday, or press Enter to skip: "
     )
     if choice == "0":
@@ -55,7 +58,7 @@ def birthday_handler(record: Record):
 def birthday_setter(record: Record) -> None:
     while True:
         birthday = Birthday(
-            input("Enter birthday (ex. 2023-12-25) or press Enter to skip: ")
+            bot.ask("Enter birthday (ex. 2023-12-25) or press Enter to skip: ")
         )
         if birthday.validator() == True:
             record.set_birthday(birthday)
@@ -86,7 +89,7 @@ def contact_adder() -> str:
 
 # What exactly to do with contact
 def contact_eraser(key: str) -> str:
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove Contact, or press Enter to skip: "
     )
     if choice == "0":
@@ -99,7 +102,7 @@ def contact_eraser(key: str) -> str:
 # Selecting what exactly to be modified for a contact
 def contact_mod_selector(key: str, record: Record):
     while True:
-        choice = input(
+        choice = bot.ask(
             "Select a number to proceed: 0-Contact, 1-Name, 2-Adress, 3-Phones, 4-Email, 5-Birthday, 6-Notes, or press Enter to skip: "
         )
         if choice == "":
@@ -109,8 +112,8 @@ def contact_mod_selector(key: str, record: Record):
         elif choice == "1":
             result = name_handler(record)
             if result != "Stop":
-                bot.book.records[result.value] = bot.book.records[key]
-                bot.book.erase_record(key)
+                bot.book.rename_record(key, result.value)
+                key = result.value
         elif choice == "2":
             address_handler(record)
         elif choice == "3":
@@ -127,12 +130,9 @@ def contact_mod_selector(key: str, record: Record):
 
 
 def contact_search() -> str:
-    inquiry = input("Enter search query: ").lower()
+    inquiry = bot.ask("Enter search query: ").lower()
 
-    result = []
-    for record in bot.book.records.values():
-        if inquiry in record.__getitem__().lower():
-            result.append(record)
+    result = bot.book.search(inquiry)
 
     if result:
         contacts_info = "\n".join(str(record) for record in result)
@@ -143,30 +143,47 @@ def contact_search() -> str:
 
 # Searching a contact to be modified
 def contact_selector():
-    name = input("Enter the exact contact name: ")
-    for key, record in bot.book.records.items():
-        if key == name:
-            print(f"\nContact found:\n{record}")
-            return contact_mod_selector(key, record)
+    name = bot.ask("Enter the exact contact name: ")
+    record = bot.book.records.get(name)
+    if record is not None:
+        print(f"\nContact found:\n{record}")
+        return contact_mod_selector(name, record)
     return f'Contact "{name}" not found'
 
 
-def days_to_birthdays() -> str:
-    days = int(input("Enter the number of days: "))
-    today = datetime.today().date()
-    result = ""
+def contacts_exporter() -> str:
+    path = bot.ask(
+        "Enter the path of a .csv or .jsonl file to export to, or press Enter to skip: "
+    )
+    if path.strip() == "":
+        return "\nOperation skipped\n"
+    try:
+        count = export_contacts(bot.book, path.strip())
+    except (OSError, ValueError) as error:
+        logger.error(error)
+        return f"\nExport failed: {error}\n"
+    return f'\n{count} contacts exported to "{path.strip()}"\n'
 
-    for record in bot.book.records.values():
-        if record.birthday is not None:
-            dob = record.birthday.birthday
-            dob_this_year = dob.replace(year=today.year)
 
-            if dob_this_year < today:
-                dob_this_year = dob_this_year.replace(year=today.year + 1)
+def contacts_importer() -> str:
+    path = bot.ask(
+        "Enter the path of a .csv or .jsonl file to import, or press Enter to skip: "
+    )
+    if path.strip() == "":
+        return "\nOperation skipped\n"
+    try:
+        stats = import_contacts(bot.book, path.strip())
+    except (OSError, ValueError) as error:
+        logger.error(error)
+        return f"\nImport failed: {error}\n"
+    summary = ", ".join(f"{key}: {value}" for key, value in stats.items())
+    return f'\nContacts imported from "{path.strip()}"\n{summary}\n'
 
-            days_to_birthday = (dob_this_year - today).days
-            if days_to_birthday <= days:
-                result += f"\n{record}"
+
+def days_to_birthdays() -> str:
+    days = int(bot.ask("Enter the number of days: "))
+
+    result = "".join(f"\n{record}" for record in bot.book.upcoming_birthdays(days))
     if result == "":
         return "\nNo contacts with upcoming birthdays\n"
     else:
@@ -175,7 +192,7 @@ def days_to_birthdays() -> str:
 
 # What exactly to do with email
 def email_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove Email, 1 - Replace Email, or press Enter to skip: "
     )
     if choice == "0":
@@ -190,7 +207,7 @@ def email_handler(record: Record):
 def email_setter(record: Record) -> None:
     while True:
         email = Email(
-            input("Enter email (ex. abc@gmail.com) or press Enter to skip: "))
+            bot.ask("Enter email (ex. abc@gmail.com) or press Enter to skip: "))
         if email.validator() == True:
             record.set_email(email)
             print(f'\nEmail "{email}" set\n')
@@ -203,7 +220,7 @@ def email_setter(record: Record) -> None:
 
 
 def exit_func() -> str:
-    a = input("Would you like to save changes (Y/N)? ")
+    a = bot.ask("Would you like to save changes (Y/N)? ", inline=False)
     if a == "Y" or a == "y":
         print(saver())
     return "Goodbye!\n"
@@ -215,10 +232,8 @@ def hello_user() -> str:
 
 def loader() -> str:
     try:
-        with open("backup.dat", "rb") as file:
-            global bot
-            bot.book = pickle.load(file)
-        return "\nAddress Book successfully loaded from backup.dat\n"
+        bot.book = bot.storage.load()
+        return f"\nAddress Book successfully loaded from {bot.storage.location}\n"
     except:
         logger.error("No file")
         return "No contact information saved"
@@ -226,7 +241,7 @@ def loader() -> str:
 
 # What exactly to do with name
 def name_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 1 - Replace Name, or press Enter to skip: "
     )
     if choice == "1":
@@ -236,11 +251,11 @@ def name_handler(record: Record):
 
 
 def name_setter(record: Record) -> str:
-    name = Name(input("Enter contact name (cannot be empty): "))
+    name = Name(bot.ask("Enter contact name (cannot be empty): "))
     while True:
         if name.value in bot.book.records.keys():
             name = Name(
-                input(
+                bot.ask(
                     f'Contact "{name}" already exists, enter new name o press Enter to exit: '
                 )
             )
@@ -254,7 +269,7 @@ def name_setter(record: Record) -> str:
                 return name
             else:
                 name = Name(
-                    input(
+                    bot.ask(
                         "Contact name cannot be empty, enter contact name o press Enter to exit: "
                     )
                 )
@@ -270,7 +285,7 @@ def note_eraser(record: Record) -> None:
     else:
         print(temp)
         index = int(
-            input(
+            bot.ask(
                 "Enter a position number of the note to remove (0 to remove all), or any other button to skip: "
             )
         )
@@ -288,7 +303,7 @@ def note_eraser(record: Record) -> None:
 
 # What exactly to do with notes
 def note_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove All or Selected Note, 1 - Replace Selected Note, 2 - Add New Note, or press Enter to skip: "
     )
     if choice == "0":
@@ -308,7 +323,7 @@ def note_modifier(record: Record) -> None:
     else:
         print(temp)
         index = int(
-            input(
+            bot.ask(
                 "Enter a position number of the note to replace, or press Enter to skip: "
             )
         )
@@ -324,7 +339,7 @@ def note_modifier(record: Record) -> None:
 
 def note_setter(record: Record, new=True) -> Note:
     while True:
-        note = Note(input("Enter new note o press Enter to skip: "))
+        note = Note(bot.ask("Enter new note o press Enter to skip: "))
         if note.validator() != False and new == True:
             record.set_note(note)
             print(f'\nNote "{note}" set\n')
@@ -342,7 +357,7 @@ def phone_eraser(record: Record) -> None:
     else:
         print(temp)
         index = int(
-            input(
+            bot.ask(
                 "Enter a position number of the phone to remove (0 to remove all), or press Enter to skip: "
             )
         )
@@ -361,7 +376,7 @@ def phone_eraser(record: Record) -> None:
 
 # What exactly to do with phone
 def phone_handler(record: Record):
-    choice = input(
+    choice = bot.ask(
         "Select a number to proceed: 0 - Remove All or Selected Phone, 1 - Replace Selected Phone, 2 - Add New Phone, or press Enter to skip: "
     )
     if choice == "0":
@@ -381,7 +396,7 @@ def phone_modifier(record: Record) -> None:
     else:
         print(temp)
         index = int(
-            input(
+            bot.ask(
                 "Enter a position number of the phone to replace, or press Enter to skip: "
             )
         )
@@ -399,7 +414,7 @@ def phone_setter(record: Record, new=True):
     while True:
         count = 0
         phone = Phone(
-            input("Enter new phone (ex. +38(099)1234567) or press Enter to skip: ")
+            bot.ask("Enter new phone (ex. +38(099)1234567) or press Enter to skip: ")
         )
 
         if phone.validator() == False:
@@ -423,36 +438,28 @@ def phone_setter(record: Record, new=True):
 
 
 def saver() -> str:
-    if bot.book.records:
-        with open("backup.dat", "wb") as file:
-            pickle.dump(bot.book, file)
-        return "\nAddress Book successfully saved to backup.dat\n"
+    if bot.book.records or bot.storage.exists():
+        bot.storage.save(bot.book)
+        return f"\nAddress Book successfully saved to {bot.storage.location}\n"
     else:
         return "\nAddress Book is empty, no data to be saved to file\n"
 
 
 def show_all_contacts() -> str:
     if bot.book.records:
-        N = int(input("How many contacts to show? "))
+        N = int(bot.ask("How many contacts to show? "))
         if N < 1:
             return "\nInput cannot be less that 1\n"
         elif N >= len(bot.book.records):
-            result = "\nPrintting all records:\n"
-            for key, value in bot.book.records.items():
-                result += f"\n{value}"
-            result += "\nEnd of address book\n"
-            return result
+            sys.stdout.write("\nPrintting all records:\n")
+            for page in bot.book.render():
+                sys.stdout.write(f"\n{page}")
+            return "\nEnd of address book\n"
         else:
-            iter = bot.book.iterator(N, bot.book.records)
-            for i in iter:
-                print(i)
-                input("Press any key to continue:\n")
-            if len(bot.book.records) % 2 == 0:
-                return "\nEnd of address book\n"
-            else:
-                return (
-                    f"{str(list(bot.book.records.values())[-1])}\nEnd of address book\n"
-                )
+            for page in bot.book.iterator(N, bot.book.records):
+                print(page)
+                bot.ask("Press any key to continue:\n")
+            return "\nEnd of address book\n"
     else:
         return "No contacts, please add\n"
 
@@ -0,0 +1,43 @@
+from collections import Counter
+from collections.abc import Iterable
+
+
+GRAM_SIZE = 3
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f" {text.lower()} "
+    return {padded[i : i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+
+# Trigram index over command names, built once and queried for "Did you mean" hints
+class CommandMatcher:
+    def __init__(
+        self, keys: Iterable[str], limit: int = 5, threshold: float = 0.5
+    ) -> None:
+        self.limit = limit
+        self.threshold = threshold
+        self.index = {}
+        for key in keys:
+            for gram in trigrams(key):
+                self.index.setdefault(gram, []).append(key)
+
+    # Share of the query trigrams found in each command
+    def scores(self, query: str) -> dict[str, float]:
+        grams = trigrams(query)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self.index.get(gram, ()))
+        return {key: count / len(grams) for key, count in counts.items()}
+
+    # The whole phrase and each of its words longer than 2 letters are scored separately
+    def suggest(self, phrase: str) -> list[str]:
+        queries = [phrase] + [word for word in phrase.split(" ") if len(word) > 2]
+        best = {}
+        for query in queries:
+            for key, score in self.scores(query).items():
+                if score > best.get(key, 0):
+                    best[key] = score
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+        return [key for key, score in ranked[: self.limit] if score >= self.threshold]
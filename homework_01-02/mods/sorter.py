@@ -1,57 +1,105 @@
 import os
 import shutil
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from mods.log_config import get_logger_error
+from mods.logic import bot
 
 
 logger = get_logger_error(__name__)
 
+CATEGORIES = {
+    ".jpg": "Images",
+    ".png": "Images",
+    ".gif": "Images",
+    ".doc": "Documents",
+    ".docx": "Documents",
+    ".pdf": "Documents",
+    ".mp4": "Videos",
+    ".avi": "Videos",
+    ".mov": "Videos",
+}
+DEFAULT_CATEGORY = "Other"
+SKIPPED_FILES = ("butler.py", "backup.dat")
+MAX_WORKERS = 8
+
+
+# Files of the folder (and its subfolders in recursive mode), the DirEntry type
+# info comes from the directory listing so no extra stat call is needed per file
+def scan_files(
+    folder_path: str, recursive: bool, skipped_folders: set[str]
+) -> Iterator[os.DirEntry]:
+    stack = [folder_path]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    if entry.name not in SKIPPED_FILES:
+                        yield entry
+                elif recursive and entry.is_dir(follow_symlinks=False):
+                    if current == folder_path and entry.name in skipped_folders:
+                        continue
+                    stack.append(entry.path)
+
+
+# Computes every destination before anything is moved, same names from
+# different subfolders get a numbered suffix
+def plan_moves(
+    folder_path: str,
+    recursive: bool = False,
+    categories: dict[str, str] = CATEGORIES,
+) -> list[tuple[str, str]]:
+    skipped_folders = set(categories.values()) | {DEFAULT_CATEGORY}
+    taken = set()
+    plan = []
+    for entry in scan_files(folder_path, recursive, skipped_folders):
+        stem, file_extension = os.path.splitext(entry.name)
+        category = categories.get(file_extension.lower(), DEFAULT_CATEGORY)
+        file_name = entry.name
+        counter = 1
+        while (category, file_name) in taken:
+            file_name = f"{stem} ({counter}){file_extension}"
+            counter += 1
+        taken.add((category, file_name))
+        plan.append((entry.path, os.path.join(folder_path, category, file_name)))
+    return plan
+
+
+def execute_moves(plan: list[tuple[str, str]], workers: int = MAX_WORKERS) -> int:
+    for category_folder in {os.path.dirname(destination) for _, destination in plan}:
+        os.makedirs(category_folder, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(lambda move: shutil.move(*move), plan):
+            pass
+    return len(plan)
+
 
 def sort_files():
     while True:
-        folder_path = input(
+        folder_path = bot.ask(
             "Enter the absolute path of the folder to sort (example: C:\Desktop\project) o press Enter to skip: "
         )
         folder_path = folder_path.strip()
 
-        categorized_files = {}
-
         if folder_path == "":
             return "Operation skipped"
 
-        try:
-            for file_name in os.listdir(folder_path):
-                if os.path.isfile(os.path.join(folder_path, file_name)):
-                    if file_name in ("butler.py", "backup.dat"):
-                        continue
+        recursive = bot.ask("Sort subfolders too (Y/N)? ").strip().lower() == "y"
+        dry_run = bot.ask("Only show the plan (Y/N)? ").strip().lower() == "y"
 
-                    file_extension = os.path.splitext(file_name)[1]
-                    category = "Other"
-                    if file_extension in (".jpg", ".png", ".gif"):
-                        category = "Images"
-                    elif file_extension in (".doc", ".docx", ".pdf"):
-                        category = "Documents"
-                    elif file_extension in (".mp4", ".avi", ".mov"):
-                        category = "Videos"
-
-                    if category not in categorized_files:
-                        categorized_files[category] = []
-
-                    categorized_files[category].append(file_name)
+        try:
+            plan = plan_moves(folder_path, recursive)
 
-            if not categorized_files:
+            if not plan:
                 return "No files found for sorting."
 
-            for category in categorized_files.keys():
-                category_folder = os.path.join(folder_path, category)
-                os.makedirs(category_folder, exist_ok=True)
-
-            for category, files in categorized_files.items():
-                category_folder = os.path.join(folder_path, category)
-                for file_name in files:
-                    source_path = os.path.join(folder_path, file_name)
-                    destination_path = os.path.join(category_folder, file_name)
-                    shutil.move(source_path, destination_path)
+            if dry_run:
+                moves = "\n".join(f"{source} -> {target}" for source, target in plan)
+                return f"{moves}\n{len(plan)} files would be moved."
 
+            execute_moves(plan)
             return "File sorting completed successfully."
 
         except:
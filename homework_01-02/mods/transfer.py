@@ -0,0 +1,160 @@
+import csv
+import json
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from mods.fields import Address, Birthday, Email, Name, Note, Phone, Record
+from mods.handler import AddressBook
+from mods.log_config import get_logger_error
+
+
+logger = get_logger_error(__name__)
+
+COLUMNS = ("name", "address", "phones", "email", "birthday", "notes")
+LISTED_COLUMNS = ("phones", "notes")
+BATCH_SIZE = 10_000
+SEPARATOR = ";"
+
+
+def file_format(path: str) -> str:
+    if path.lower().endswith(".csv"):
+        return "csv"
+    if path.lower().endswith((".jsonl", ".json")):
+        return "jsonl"
+    raise ValueError(f'Unsupported file type "{path}", use .csv or .jsonl')
+
+
+# Rows are dicts with the COLUMNS keys, phones and notes are lists of strings
+def read_csv(file) -> Iterator[dict]:
+    for row in csv.DictReader(file):
+        yield {
+            **row,
+            "phones": split_listed(row.get("phones")),
+            "notes": split_listed(row.get("notes")),
+        }
+
+
+# Lines that are not JSON objects of strings, with lists of strings for phones
+# and notes, come out empty and are rejected like CSV rows without a name
+def read_jsonl(file) -> Iterator[dict]:
+    for line in file:
+        line = line.strip()
+        if line:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if valid_row(row) else {}
+
+
+def valid_row(row) -> bool:
+    if not isinstance(row, dict):
+        return False
+    for column in COLUMNS:
+        value = row.get(column)
+        if value is None:
+            continue
+        if column in LISTED_COLUMNS:
+            if not isinstance(value, list) or not all(
+                isinstance(item, str) for item in value
+            ):
+                return False
+        elif not isinstance(value, str):
+            return False
+    return True
+
+
+def split_listed(value: str | None) -> list[str]:
+    if not value:
+        return []
+    return [item.strip() for item in value.split(SEPARATOR) if item.strip()]
+
+
+def batches(rows: Iterable[dict], size: int = BATCH_SIZE) -> Iterator[list[dict]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def records_from_batch(batch: list[dict], stats: dict) -> Iterator[Record]:
+    phones = [[phone or "" for phone in row.get("phones") or []] for row in batch]
+    phone_checks = iter(Phone.validate_many(phone for row in phones for phone in row))
+    emails = [row.get("email") or "" for row in batch]
+    email_checks = Email.validate_many(emails)
+
+    for row, row_phones, email, email_check in zip(batch, phones, emails, email_checks):
+        checks = [next(phone_checks) for _ in row_phones]
+        name = Name((row.get("name") or "").strip())
+        if name.validator() == False:
+            stats["rejected"] += 1
+            continue
+
+        record = Record(name)
+        address = Address(row.get("address") or "")
+        if address.validator() != False:
+            record.set_address(address)
+        for phone, check in zip(row_phones, checks):
+            if check:
+                record.set_phone(Phone(phone))
+            elif check is None:
+                stats["invalid fields"] += 1
+        if email_check:
+            record.set_email(Email(email))
+        elif email_check is None:
+            stats["invalid fields"] += 1
+        birthday = Birthday(row.get("birthday") or "")
+        if birthday.validator() == True:
+            record.set_birthday(birthday)
+        elif birthday.validator() is None:
+            stats["invalid fields"] += 1
+        for note in row.get("notes") or []:
+            if note:
+                record.set_note(Note(note))
+        yield record
+
+
+def import_contacts(book: AddressBook, path: str) -> dict:
+    reader = read_csv if file_format(path) == "csv" else read_jsonl
+    stats = {"imported": 0, "duplicates": 0, "rejected": 0, "invalid fields": 0}
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        for batch in batches(reader(file)):
+            fresh = {}
+            for record in records_from_batch(batch, stats):
+                key = record.name.value
+                if key in fresh or key in book.records:
+                    stats["duplicates"] += 1
+                    continue
+                fresh[key] = record
+            book.add_records(list(fresh.values()))
+            stats["imported"] += len(fresh)
+    return stats
+
+
+def rows_from_book(book: AddressBook) -> Iterator[dict]:
+    for record in book.records.values():
+        yield {
+            "name": str(record.name),
+            "address": "" if record.address is None else str(record.address),
+            "phones": [str(phone) for phone in record.phones],
+            "email": "" if record.email is None else str(record.email),
+            "birthday": "" if record.birthday is None else str(record.birthday),
+            "notes": [str(note) for note in record.notes],
+        }
+
+
+def export_contacts(book: AddressBook, path: str) -> int:
+    fmt = file_format(path)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        if fmt == "csv":
+            writer = csv.DictWriter(file, fieldnames=COLUMNS)
+            writer.writeheader()
+            for row in rows_from_book(book):
+                row["phones"] = SEPARATOR.join(row["phones"])
+                row["notes"] = SEPARATOR.join(row["notes"])
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in rows_from_book(book):
+                file.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+    return count
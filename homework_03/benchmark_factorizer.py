@@ -0,0 +1,93 @@
+import argparse
+from multiprocessing import Pool, cpu_count
+from random import Random
+from time import time
+
+from factorizer import (
+    divisors,
+    factorize_numpy,
+    factorize_parallel,
+    factorize_sync,
+    is_prime,
+)
+
+
+def random_prime(rng: Random, bits: int) -> int:
+    while True:
+        candidate = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if is_prime(candidate):
+            return candidate
+
+
+# Mostly small numbers with a few hard semiprimes, so the work per number is skewed
+def skewed_numbers(count: int, hard_share: float, seed: int = 1) -> list[int]:
+    rng = Random(seed)
+    numbers = []
+    for _ in range(count):
+        if rng.random() < hard_share:
+            numbers.append(random_prime(rng, 28) * random_prime(rng, 28))
+        else:
+            numbers.append(rng.randrange(1, 10**8))
+    return numbers
+
+
+def streamed(numbers: list[int], workers: int) -> list[list[int]]:
+    result = [None] * len(numbers)
+    for index, number, found in factorize_parallel(numbers, workers):
+        result[index] = found
+    return result
+
+
+def bench_skewed(count: int, hard: float, workers: int) -> None:
+    numbers = skewed_numbers(count, hard)
+    print(f"{count} numbers, {workers} workers")
+
+    timer = time()
+    with Pool(workers) as pool:
+        expected = pool.map(divisors, numbers, chunksize=1)
+    print(f"pool.map, one number per task: {round(time() - timer, 4)}s")
+
+    timer = time()
+    with Pool(workers) as pool:
+        pool.map(divisors, numbers)
+    print(f"pool.map, default chunks:      {round(time() - timer, 4)}s")
+
+    timer = time()
+    result = streamed(numbers, workers)
+    print(f"factorize_parallel, streamed:  {round(time() - timer, 4)}s")
+    assert result == expected
+
+
+def bench_numpy(count: int, workers: int) -> None:
+    numbers = Random(1).choices(range(1, 10**8), k=count)
+    print(f"{count} numbers below 10**8, {workers} workers")
+
+    timer = time()
+    expected = factorize_sync(numbers)
+    print(f"factorize_sync, pure Python:   {round(time() - timer, 4)}s")
+
+    timer = time()
+    result = streamed(numbers, workers)
+    print(f"factorize_parallel, processes: {round(time() - timer, 4)}s")
+    assert result == expected
+
+    timer = time()
+    result = factorize_numpy(numbers)
+    print(f"factorize_numpy, vectorized:   {round(time() - timer, 4)}s")
+    assert result == expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of parallel factorizers")
+    parser.add_argument("-n", "--count", type=int, default=200_000)
+    parser.add_argument("--hard", type=float, default=0.01, help="Share of semiprimes")
+    parser.add_argument("-w", "--workers", type=int, default=cpu_count())
+    parser.add_argument(
+        "--numpy", action="store_true", help="Compare the NumPy batch backend instead"
+    )
+    args = parser.parse_args()
+
+    if args.numpy:
+        bench_numpy(args.count, args.workers)
+    else:
+        bench_skewed(args.count, args.hard, args.workers)
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from time import time
+
+from sorter import ENGINES, STRATEGIES, sort_folder, sort_folder_async
+
+
+def make_tree(root: Path, small: int, big_count: int, big_size: int) -> int:
+    per_folder = 1000
+    for i in range(small):
+        folder = root / "small" / str(i // per_folder)
+        if i % per_folder == 0:
+            folder.mkdir(parents=True)
+        (folder / f"file{i}.{('txt', 'py', 'md', 'json')[i % 4]}").write_bytes(
+            b"x" * 1024
+        )
+
+    block = os.urandom(1024 * 1024)
+    (root / "big").mkdir()
+    for i in range(big_count):
+        with open(root / "big" / f"file{i}.bin", "wb") as file:
+            for _ in range(big_size):
+                file.write(block)
+    return small * 1024 + big_count * big_size * 1024 * 1024
+
+
+def run(
+    source: Path, output: Path, engine: str, strategy: str, size: int, workers: int
+) -> None:
+    timer = time()
+    if engine == "asyncio":
+        progress = asyncio.run(
+            sort_folder_async(source, output, workers, strategy=strategy)
+        )
+    else:
+        progress = sort_folder(source, output, workers, strategy=strategy)
+    elapsed = time() - timer
+    print(
+        "{:<7} | {:<10} | {:>8.3f}s | {:>10.0f} files/s | {:>9.1f} MB/s | {}".format(
+            engine,
+            strategy,
+            elapsed,
+            progress.files / elapsed,
+            size / 1024 / 1024 / elapsed,
+            dict(progress.transfer.used),
+        )
+    )
+    shutil.rmtree(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of sorter transfers")
+    parser.add_argument("--small", type=int, default=100_000, help="1 KB files")
+    parser.add_argument("--big-count", type=int, default=2, help="Large files")
+    parser.add_argument("--big-size", type=int, default=2048, help="Large file, MB")
+    parser.add_argument("--dir", help="Folder for the test tree (same device)")
+    parser.add_argument("--output-dir", help="Folder for the output (other device)")
+    parser.add_argument("-w", "--workers", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as folder:
+        source = Path(folder) / "source"
+        size = make_tree(source, args.small, args.big_count, args.big_size)
+        output_root = Path(args.output_dir or folder)
+        print(f"{args.small} small files, {args.big_count} x {args.big_size} MB files")
+        for engine in ENGINES:
+            for strategy in STRATEGIES:
+                output = output_root / f"sorted-{engine}-{strategy}"
+                run(source, output, engine, strategy, size, args.workers)
@@ -1,31 +1,458 @@
+import argparse
+import sqlite3
+import sys
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from math import gcd, isqrt
 from multiprocessing import Pool, cpu_count, current_process
+from random import randrange
 from time import time
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SIEVE_LIMIT = 2**16
+CHUNK_SIZE = 256
+IN_FLIGHT_PER_WORKER = 4
+NUMPY_CELLS = 2**22
+NUMPY_MAX = 2**32
+NUMPY_BATCH = 4096
+CACHE_BATCH = 4096
+COFACTOR_PROBE = 1000
+LRU_SIZE = 100_000
+CACHE_COMMIT_EVERY = 1000
+
+# Bases that make Miller-Rabin deterministic for every n < 3.3 * 10**24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+
+def sieve(limit: int) -> list[int]:
+    is_prime = bytearray([1]) * (limit + 1)
+    is_prime[0:2] = b"\x00\x00"
+    for i in range(2, isqrt(limit) + 1):
+        if is_prime[i]:
+            is_prime[i * i :: i] = bytes(len(range(i * i, limit + 1, i)))
+    return [i for i, flag in enumerate(is_prime) if flag]
+
+
+SMALL_PRIMES = sieve(SIEVE_LIMIT)
+
+
+def is_prime(number: int) -> bool:
+    if number < 2:
+        return False
+    for p in MILLER_RABIN_BASES:
+        if number % p == 0:
+            return number == p
+    d, s = number - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in MILLER_RABIN_BASES:
+        x = pow(a, d, number)
+        if x in (1, number - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, number)
+            if x == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def pollard_rho(number: int) -> int:
+    if number % 2 == 0:
+        return 2
+    while True:
+        c = randrange(1, number)
+        x = y = randrange(2, number)
+        d = 1
+        while d == 1:
+            x = (x * x + c) % number
+            y = (y * y + c) % number
+            y = (y * y + c) % number
+            d = gcd(abs(x - y), number)
+        if d != number:
+            return d
+
+
+def merge_factors(factors: dict[int, int], other: dict[int, int]) -> dict[int, int]:
+    for p, power in other.items():
+        factors[p] = factors.get(p, 0) + power
+    return factors
+
+
+# "known" may return the cached factorization of a cofactor, then only the
+# part of the number that was already divided out has to be factorized
+def prime_factors(
+    number: int, known: Callable[[int], dict[int, int] | None] | None = None
+) -> dict[int, int]:
+    factors = {}
+    for p in SMALL_PRIMES:
+        if p * p > number:
+            break
+        if number % p == 0:
+            while number % p == 0:
+                factors[p] = factors.get(p, 0) + 1
+                number //= p
+            cached = known(number) if known and number > 1 else None
+            if cached is not None:
+                return merge_factors(factors, cached)
+
+    # What is left has no prime factor below SIEVE_LIMIT
+    stack = [number] if number > 1 else []
+    while stack:
+        n = stack.pop()
+        cached = known(n) if known else None
+        if cached is not None:
+            merge_factors(factors, cached)
+        elif n < SIEVE_LIMIT**2 or is_prime(n):
+            factors[n] = factors.get(n, 0) + 1
+        else:
+            d = pollard_rho(n)
+            stack.extend((d, n // d))
+    return factors
+
+
+def divisors_from_factors(factors: dict[int, int]) -> list[int]:
+    result = [1]
+    for p, power in factors.items():
+        result = [d * p**k for d in result for k in range(power + 1)]
+    return sorted(result)
+
+
+def divisors(number: int) -> list[int]:
+    if number < 1:
+        return []
+    return divisors_from_factors(prime_factors(number))
+
+
+# Going up the sorted divisors, each one still dividing what is left is prime,
+# every smaller prime has already been divided out
+def factors_from_divisors(number: int, found: list[int]) -> dict[int, int]:
+    factors = {}
+    for d in found[1:]:
+        if number == 1:
+            break
+        while number % d == 0:
+            factors[d] = factors.get(d, 0) + 1
+            number //= d
+    return factors
+
+
+# Factorizations kept in an in-process LRU and, optionally, in an SQLite file
+# that survives restarts, cofactors found in either are reused. Each entry keeps
+# the time its factorization took, so hits can report the time they saved
+class FactorCache:
+    def __init__(self, path: str | None = None, size: int = LRU_SIZE) -> None:
+        self.size = size
+        self.memory = OrderedDict()
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS factors "
+                "(n TEXT PRIMARY KEY, factors TEXT, seconds REAL)"
+            )
+        self.unsaved = 0
+        self.stats = {"memory": 0, "disk": 0, "partial": 0, "miss": 0}
+        self.saved_time = 0.0
+        self.spent_time = 0.0
+
+    def lookup(self, number: int) -> tuple[dict[int, int], float, str] | None:
+        entry = self.memory.get(number)
+        if entry is not None:
+            self.memory.move_to_end(number)
+            return entry + ("memory",)
+        if self.connection is not None:
+            row = self.connection.execute(
+                "SELECT factors, seconds FROM factors WHERE n = ?", (str(number),)
+            ).fetchone()
+            if row is not None:
+                factors = {
+                    int(p): int(power)
+                    for p, power in (
+                        item.split(":") for item in row[0].split(",") if item
+                    )
+                }
+                self.remember(number, factors, row[1])
+                return factors, row[1], "disk"
+        return None
+
+    def remember(self, number: int, factors: dict[int, int], seconds: float) -> None:
+        self.memory[number] = (factors, seconds)
+        if len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def store(self, number: int, factors: dict[int, int], seconds: float) -> None:
+        self.remember(number, factors, seconds)
+        if self.connection is not None:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO factors VALUES (?, ?, ?)",
+                (
+                    str(number),
+                    ",".join(f"{p}:{power}" for p, power in factors.items()),
+                    seconds,
+                ),
+            )
+            self.unsaved += 1
+            if self.unsaved >= CACHE_COMMIT_EVERY:
+                self.commit()
+
+    def hit(self, number: int) -> dict[int, int] | None:
+        entry = self.lookup(number)
+        if entry is None:
+            return None
+        factors, seconds, source = entry
+        self.stats[source] += 1
+        self.saved_time += seconds
+        return factors
+
+    def factors(self, number: int) -> dict[int, int]:
+        factors = self.hit(number)
+        if factors is not None:
+            return factors
+
+        reused = []
+
+        def known(cofactor: int) -> dict[int, int] | None:
+            entry = self.lookup(cofactor)
+            if entry is None:
+                return None
+            reused.append(entry[1])
+            return entry[0]
+
+        timer = time()
+        factors = prime_factors(number, known)
+        seconds = time() - timer
+        self.spent_time += seconds
+        self.saved_time += sum(reused)
+        self.stats["partial" if reused else "miss"] += 1
+        self.store(number, factors, seconds + sum(reused))
+        return factors
+
+    def divisors(self, number: int) -> list[int]:
+        if number < 1:
+            return []
+        return divisors_from_factors(self.factors(number))
+
+    # Primes below COFACTOR_PROBE are divided out and what is left after each
+    # of them is looked up, a cached cofactor finishes the number right here
+    def from_cofactor(self, number: int) -> tuple[dict[int, int], float] | None:
+        timer = time()
+        factors = {}
+        for p in SMALL_PRIMES:
+            if p >= COFACTOR_PROBE or p * p > number:
+                break
+            if number % p == 0:
+                while number % p == 0:
+                    factors[p] = factors.get(p, 0) + 1
+                    number //= p
+                entry = self.lookup(number) if number > 1 else None
+                if entry is not None:
+                    seconds = time() - timer
+                    self.spent_time += seconds
+                    self.saved_time += entry[1]
+                    self.stats["partial"] += 1
+                    return merge_factors(factors, entry[0]), seconds + entry[1]
+        return None
+
+    # Divisors of a batch, misses whose cofactor is cached are finished here and
+    # the rest are handed to compute at once, so a process pool or NumPy still
+    # does the heavy work. A number repeated in the batch counts as a memory hit
+    def divisors_many(
+        self, numbers: list[int], compute: Callable[[list[int]], Iterable[list[int]]]
+    ) -> list[list[int]]:
+        results = {}
+        misses = {}
+        for number in numbers:
+            if number < 1:
+                results[number] = []
+            elif number in results or number in misses:
+                self.stats["memory"] += 1
+            elif (factors := self.hit(number)) is not None:
+                results[number] = divisors_from_factors(factors)
+            elif (reused := self.from_cofactor(number)) is not None:
+                factors, seconds = reused
+                self.store(number, factors, seconds)
+                results[number] = divisors_from_factors(factors)
+            else:
+                misses[number] = None
+        misses = list(misses)
+        if misses:
+            timer = time()
+            computed = list(compute(misses))
+            seconds = time() - timer
+            self.spent_time += seconds
+            self.stats["miss"] += len(misses)
+            for number, found in zip(misses, computed):
+                self.store(
+                    number, factors_from_divisors(number, found), seconds / len(misses)
+                )
+                results[number] = found
+        return [results[number] for number in numbers]
+
+    def commit(self) -> None:
+        if self.connection is not None:
+            self.connection.commit()
+        self.unsaved = 0
+
+    def close(self) -> None:
+        self.commit()
+        if self.connection is not None:
+            self.connection.close()
+
+    def report(self) -> str:
+        lookups = sum(self.stats.values())
+        hits = self.stats["memory"] + self.stats["disk"]
+        hit_rate = hits / lookups if lookups else 0.0
+        return (
+            f"Lookups: {lookups}, memory hits: {self.stats['memory']}, "
+            f"disk hits: {self.stats['disk']}, "
+            f"reused cofactors: {self.stats['partial']}, misses: {self.stats['miss']}\n"
+            f"Hit rate: {hit_rate:.1%}, time spent: {self.spent_time:.4f}s, "
+            f"time saved: ~{self.saved_time:.4f}s"
+        )
+
 
 def factorize_sync(number):
     print(f"Starting syncronous calculation: {current_process().name}")
-    results = []
-    for num in number:
-        result = []
-        for i in range(1, num + 1):
-            if num % i == 0:
-                result.append(i)
-        results.append(result)
+    results = [divisors(num) for num in number]
     print(f"Syncronous calculation is finished: {current_process().name}")
     return results
 
 
 def factorize_async(number):
     print(f"Starting asyncronous calculation: {current_process().name}")
-    result = []
-    for i in range(1, number + 1):
-        if number % i == 0:
-            result.append(i)
+    result = divisors(number)
     print(f"{current_process().name} is finished")
     return result
 
 
-if __name__ == "__main__":
+def factorize_batch(batch: list[tuple[int, int]]) -> list[tuple[int, int, list[int]]]:
+    return [(index, number, divisors(number)) for index, number in batch]
+
+
+def factorize_parallel(
+    numbers: Iterable[int], workers: int | None = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[int, int, list[int]]]:
+    # Small batches with a few of them in flight per worker keep every process busy
+    # and read the input lazily, results come as (position, number, divisors)
+    workers = workers or cpu_count()
+    indexed = enumerate(numbers)
+    batches = iter(lambda: list(islice(indexed, chunk_size)), [])
+    with ProcessPoolExecutor(workers) as executor:
+        pending = {
+            executor.submit(factorize_batch, batch)
+            for batch in islice(batches, workers * IN_FLIGHT_PER_WORKER)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                batch = next(batches, None)
+                if batch is not None:
+                    pending.add(executor.submit(factorize_batch, batch))
+
+
+def factorize_numpy(numbers: Iterable[int]) -> list[list[int]]:
+    # Same result as factorize_sync, every number below NUMPY_MAX is tested
+    # against the candidates 1..isqrt(number) in blocks of at most NUMPY_CELLS
+    # remainders, divisors above the square root are the quotients of the ones
+    # below it. Larger numbers go to divisors(), trial division up to their
+    # square root would cost far more than factorizing them
+    if np is None:
+        raise RuntimeError(
+            "NumPy backend requires numpy, install it with 'pip install numpy'"
+        )
+    numbers = list(numbers)
+    results = [
+        divisors(number) if not 0 < number < NUMPY_MAX else None for number in numbers
+    ]
+    positions = [i for i, result in enumerate(results) if result is None]
+    if not positions:
+        return results
+
+    # Sorted values let every block skip the numbers whose root it has passed
+    order = sorted(positions, key=numbers.__getitem__)
+    values = np.array([numbers[i] for i in order], dtype=np.int64)
+    roots = np.array([isqrt(int(value)) for value in values], dtype=np.int64)
+    limit = int(roots[-1])
+    small = [[] for _ in order]
+    block = max(1, NUMPY_CELLS // len(values))
+    for start in range(1, limit + 1, block):
+        first = int(np.searchsorted(roots, start))
+        candidates = np.arange(start, min(start + block, limit + 1), dtype=np.int64)
+        hits = (np.mod(values[first:, None], candidates[None, :]) == 0) & (
+            candidates[None, :] <= roots[first:, None]
+        )
+        for row, column in zip(*np.nonzero(hits)):
+            small[first + row].append(int(candidates[column]))
+
+    for row, i in enumerate(order):
+        number = numbers[i]
+        large = [number // d for d in reversed(small[row]) if d * d != number]
+        results[i] = small[row] + large
+    return results
+
+
+def read_numbers(path: str) -> Iterator[int]:
+    with open(path) as file:
+        for line in file:
+            for item in line.split():
+                yield int(item)
+
+
+def factorize_file(
+    path: str,
+    workers: int | None = None,
+    backend: str = "process",
+    cache_path: str | None = None,
+) -> None:
+    cache = executor = None
+    if cache_path:
+        # Misses of a batch go to the chosen backend, the pool is kept for the run
+        cache = FactorCache(cache_path)
+        if backend == "numpy":
+            compute = factorize_numpy
+        else:
+            executor = ProcessPoolExecutor(workers or cpu_count())
+            compute = partial(executor.map, divisors, chunksize=CHUNK_SIZE)
+        numbers = read_numbers(path)
+        found = (
+            pair
+            for batch in iter(lambda: list(islice(numbers, CACHE_BATCH)), [])
+            for pair in zip(batch, cache.divisors_many(batch, compute))
+        )
+    elif backend == "numpy":
+        numbers = read_numbers(path)
+        results = (
+            zip(batch, factorize_numpy(batch))
+            for batch in iter(lambda: list(islice(numbers, NUMPY_BATCH)), [])
+        )
+        found = (pair for batch in results for pair in batch)
+    else:
+        found = (
+            (number, result)
+            for index, number, result in factorize_parallel(read_numbers(path), workers)
+        )
+    for number, result in found:
+        print(f"{number}: {' '.join(map(str, result))}")
+
+    if executor is not None:
+        executor.shutdown()
+    if cache is not None:
+        cache.close()
+        print(cache.report(), file=sys.stderr)
+
+
+def demo() -> None:
     numbers = (
         128,
         255,
@@ -41,11 +468,37 @@ if __name__ == "__main__":
 
     a, b, c, d, e, f, g, h = factorize_sync(numbers)
 
-    print(f"Synchronous calculation has taken {round(time() - timer1, 4)}s")  # 13.1734s
+    print(f"Synchronous calculation has taken {round(time() - timer1, 4)}s")  # 0.0005s
 
     assert a == [1, 2, 4, 8, 16, 32, 64, 128]
     assert b == [1, 3, 5, 15, 17, 51, 85, 255]
     assert c == [1, 3, 9, 41, 123, 271, 369, 813, 2439, 11111, 33333, 99999]
+    assert d == [
+        1,
+        2,
+        4,
+        5,
+        7,
+        10,
+        14,
+        20,
+        28,
+        35,
+        70,
+        140,
+        76079,
+        152158,
+        304316,
+        380395,
+        532553,
+        760790,
+        1065106,
+        1521580,
+        2130212,
+        2662765,
+        5325530,
+        10651060,
+    ]
 
     print(f"CPU count: {cpu_count()}")  # 8
     timer2 = time()
@@ -55,8 +508,32 @@ if __name__ == "__main__":
         pool.close()
         pool.join()
 
-    print(f"Asynchronous calculation has taken {round(time() - timer2, 4)}s")  # 6.8109s
+    print(f"Asynchronous calculation has taken {round(time() - timer2, 4)}s")  # 0.0547s
 
     assert s == [1, 2, 4, 8, 16, 32, 64, 128]
     assert t == [1, 3, 5, 15, 17, 51, 85, 255]
     assert u == [1, 3, 9, 41, 123, 271, 369, 813, 2439, 11111, 33333, 99999]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App for finding divisors of numbers")
+    parser.add_argument("-f", "--file", help="File with numbers to factorize")
+    parser.add_argument("-w", "--workers", type=int, help="Number of processes")
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=("process", "numpy"),
+        default="process",
+        help="Process pool or NumPy batch factorizer",
+    )
+    parser.add_argument(
+        "-c", "--cache", help="SQLite file to keep factorizations between runs"
+    )
+    args = vars(parser.parse_args())
+
+    if args.get("file"):
+        factorize_file(
+            args["file"], args.get("workers"), args.get("backend"), args.get("cache")
+        )
+    else:
+        demo()
@@ -1,73 +1,522 @@
 import argparse
+import asyncio
+import errno
+import json
 import logging
+import os
+from collections import Counter
+from collections.abc import Callable
+from itertools import islice
 from pathlib import Path
-from shutil import copyfile
-from threading import Thread, Semaphore
+from queue import Queue
+from shutil import copyfileobj
+from threading import Lock, Thread, get_ident
 from time import time
 
 """
 python sorter --source -s SourceFolder
 python sorter --output -o OutputFolder
+python sorter --workers -w 10
+python sorter --mode -m copy|move
+python sorter --strategy auto|link|copy_range|sendfile|buffered
+python sorter --engine -e threads|asyncio
+python sorter --incremental -i --hash --dedup
 """
 
-parser = argparse.ArgumentParser(description="App for sorting files in folder")
-parser.add_argument("-s", "--source", help="Source folder", required=True)
-parser.add_argument("-o", "--output", help="Output folder")
-args = vars(parser.parse_args())
-source = args.get("source")
-output = args.get("output")
-
-source_folder = Path(source)
-if output:
-    output_folder = Path(output)
-else:
-    output_folder = Path(f"{source} (sorted)")
-
-threads = []
-
-
-def parse_folder(path: Path, condition: Semaphore) -> None:
-    with condition:
-        logging.debug(f"Start parsing folder '{path}'")
-        for el in path.iterdir():
-            if el.is_file():
-                th = Thread(target=handle_file, args=(el, condition))
-                th.start()
-                threads.append(th)
+WORKERS = 10
+QUEUE_SIZE = 1000
+PROGRESS_EVERY = 1000
+BUFFER_SIZE = 1024 * 1024
+MANIFEST_FILE = ".manifest.json"
+ENGINES = ("threads", "asyncio")
+
+
+def link_file(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.unlink(dst)
+        os.link(src, dst)
+
+
+def move_file(src: Path, dst: Path) -> None:
+    os.replace(src, dst)
+
+
+def copy_range(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        left = os.fstat(fsrc.fileno()).st_size
+        while left > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), left)
+            if copied == 0:
+                break
+            left -= copied
+
+
+def send_file(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
+
+def buffered_copy(src: Path, dst: Path) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        copyfileobj(fsrc, fdst, BUFFER_SIZE)
+
+
+# A copy is written to a temporary file that then replaces dst, so a dst that
+# an earlier run hard-linked to the source is never truncated through the link
+def replace_with_copy(copy: Callable[[Path, Path], None], src: Path, dst: Path) -> None:
+    temp = dst.with_name(f".{dst.name}.{get_ident()}.part")
+    try:
+        copy(src, temp)
+        os.replace(temp, dst)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+try:
+    from xxhash import xxh3_128 as new_digest
+except ImportError:
+    from hashlib import blake2b
+
+    def new_digest():
+        return blake2b(digest_size=16)
+
+
+# Errors that mean "this kernel or filesystem can not do it", not a broken file
+FALLBACK_ERRORS = (errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOSYS, errno.ENOTSUP)
+
+FAST_COPIES = []
+if hasattr(os, "copy_file_range"):
+    FAST_COPIES.append(("copy_range", copy_range))
+if hasattr(os, "sendfile"):
+    FAST_COPIES.append(("sendfile", send_file))
+
+# Only what this system can do is offered, a kernel copy missing here is not
+STRATEGIES = ("auto", "link", *(name for name, _ in FAST_COPIES), "buffered")
+
+
+# Picks the cheapest way to get a file into the output folder: a hard link (or a
+# rename when moving) on the same device, a kernel-side copy across devices and
+# a buffered copy only when nothing else works
+class Transfer:
+    def __init__(
+        self, output_folder: Path, mode: str = "copy", strategy: str = "auto"
+    ) -> None:
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Transfer strategy "{strategy}" is not available here')
+        self.output_folder = output_folder
+        self.mode = mode
+        self.strategy = strategy
+        self.created = set()
+        self.devices = {}
+        self.lock = Lock()
+        self.used = Counter()
+        self.ensure_folder(output_folder)
+        self.output_device = os.stat(output_folder).st_dev
+
+    # mkdir is issued once per extension folder, not once per file
+    def ensure_folder(self, folder: Path) -> None:
+        if folder not in self.created:
+            folder.mkdir(exist_ok=True, parents=True)
+            self.created.add(folder)
+
+    def device(self, folder: Path) -> int:
+        device = self.devices.get(folder)
+        if device is None:
+            device = self.devices[folder] = os.stat(folder).st_dev
+        return device
+
+    def candidates(self, src: Path) -> list[tuple[str, Callable[[Path, Path], None]]]:
+        if self.strategy == "link":
+            return [("link", link_file)]
+        if self.strategy == "buffered":
+            return [("buffered", buffered_copy)]
+        if self.strategy != "auto":
+            return [item for item in FAST_COPIES if item[0] == self.strategy]
+
+        same_device = self.device(src.parent) == self.output_device
+        if self.mode == "move":
+            first = [("rename", move_file)] if same_device else []
+        else:
+            first = [("link", link_file)] if same_device else []
+        return first + FAST_COPIES + [("buffered", buffered_copy)]
+
+    # A source already linked to dst is left as it is
+    def __call__(self, src: Path, dst: Path) -> str:
+        self.ensure_folder(dst.parent)
+        try:
+            same = os.path.samefile(src, dst)
+        except OSError:
+            same = False
+        if same:
+            self.finish(src, "same")
+            return "same"
+        candidates = self.candidates(src)
+        for position, (name, transfer) in enumerate(candidates):
+            try:
+                if name in ("link", "rename"):
+                    transfer(src, dst)
+                else:
+                    replace_with_copy(transfer, src, dst)
+                break
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRORS or position == len(candidates) - 1:
+                    raise
+        self.finish(src, name)
+        return name
+
+    # A file whose content is already in the output is hard-linked to that copy
+    def link_duplicate(self, src: Path, existing: Path, dst: Path) -> None:
+        self.ensure_folder(dst.parent)
+        link_file(existing, dst)
+        self.finish(src, "dedup")
+
+    # When moving, the source is removed unless it was renamed into place
+    def finish(self, src: Path, name: str) -> None:
+        if self.mode == "move" and name != "rename":
+            os.unlink(src)
+        self.count(name)
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.used[name] += 1
+
+
+# What previous runs put into the output folder: source path -> size, mtime,
+# destination and (when hashing) content digest. Unchanged files are skipped,
+# with dedup a file whose content is already in the output is hard-linked to it
+class Manifest:
+    def __init__(self, output_folder: Path, hashing: bool = False, dedup: bool = False):
+        self.path = output_folder / MANIFEST_FILE
+        self.hashing = hashing or dedup
+        self.dedup = dedup
+        self.lock = Lock()
+        self.skipped = 0
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as file:
+                self.entries = json.load(file)
+        # Entries are kept in the order they were recorded, so the last source
+        # written to a destination is the one that holds it
+        self.holders = {
+            entry["destination"]: source for source, entry in self.entries.items()
+        }
+        self.contents = {}
+        for destination, source in self.holders.items():
+            digest = self.entries[source].get("digest")
+            if digest:
+                self.contents.setdefault(digest, destination)
+
+    # The copy made last time must still be in the output with the same size,
+    # not replaced by another source with the same name
+    def unchanged(self, file: Path, stat: os.stat_result) -> bool:
+        entry = self.entries.get(str(file))
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime"] != stat.st_mtime_ns
+            or self.holders.get(entry["destination"]) != str(file)
+        ):
+            return False
+        try:
+            if os.stat(entry["destination"]).st_size != entry["size"]:
+                return False
+        except OSError:
+            return False
+        with self.lock:
+            self.skipped += 1
+        return True
+
+    def duplicate_of(self, digest: str, destination: Path) -> Path | None:
+        if not self.dedup:
+            return None
+        existing = self.contents.get(digest)
+        if existing is None or existing == str(destination):
+            return None
+        return Path(existing) if os.path.exists(existing) else None
+
+    def record(
+        self, file: Path, stat: os.stat_result, destination: Path, digest: str | None
+    ) -> None:
+        source, destination = str(file), str(destination)
+        with self.lock:
+            # The content that was at this destination is not there any more
+            previous = self.holders.get(destination)
+            if previous is not None:
+                replaced = self.entries[previous].get("digest")
+                if replaced and self.contents.get(replaced) == destination:
+                    del self.contents[replaced]
+            self.entries.pop(source, None)
+            self.entries[source] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "destination": destination,
+                "digest": digest,
+            }
+            self.holders[destination] = source
+            if digest:
+                self.contents.setdefault(digest, destination)
+
+    def save(self) -> None:
+        temp = self.path.with_suffix(".tmp")
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file)
+        os.replace(temp, self.path)
+
+
+def content_digest(file: Path) -> str:
+    digest = new_digest()
+    with open(file, "rb") as source:
+        while chunk := source.read(BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Progress:
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.files = 0
+        self.errors = 0
+        self.bytes = 0
+        self.transfer = None
+        self.manifest = None
+        self.started = time()
+
+    # size is None for a file that could not be transferred
+    def done(self, size: int | None) -> None:
+        with self.lock:
+            self.files += 1
+            if size is None:
+                self.errors += 1
             else:
-                th = Thread(target=parse_folder, args=(el, condition))
-                th.start()
-                threads.append(th)
-        logging.debug(f"End parsing folder '{path}'")
-
-
-def handle_file(file: Path, condition: Semaphore) -> None:
-    with condition:
-        logging.debug(f"Start handling file '{file}'")
-        ext = file.suffix.lstrip(".")
-        new_path = output_folder / ext
-        if not ext:
-            new_path = output_folder / "!unknown"
+                self.bytes += size
+            if self.files % PROGRESS_EVERY == 0:
+                logging.info(f"Handled {self.files} files, {self.errors} errors")
+
+    def throughput(self) -> str:
+        elapsed = max(time() - self.started, 1e-9)
+        return (
+            f"{self.files / elapsed:.0f} files/s, "
+            f"{self.bytes / 1024 / 1024 / elapsed:.1f} MB/s"
+        )
+
+
+# One scanner walks the tree, the output folder is skipped if it is inside the source
+def scan_folder(path: Path, output_folder: Path):
+    skipped = output_folder.resolve()
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        logging.debug(f"Start parsing folder '{current}'")
         try:
-            new_path.mkdir(exist_ok=True, parents=True)
-            copyfile(file, new_path / file.name)
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if Path(entry.path).resolve() != skipped:
+                            stack.append(Path(entry.path))
+                    elif entry.is_file():
+                        yield Path(entry.path)
         except OSError as e:
             logging.error(e)
-        logging.debug(f"End handling file '{file}'")
+        logging.debug(f"End parsing folder '{current}'")
+
+
+def handle_file(
+    file: Path, transfer: Transfer, manifest: Manifest | None = None
+) -> int | None:
+    logging.debug(f"Start handling file '{file}'")
+    ext = file.suffix.lstrip(".")
+    new_path = transfer.output_folder / ext
+    if not ext:
+        new_path = transfer.output_folder / "!unknown"
+    destination = new_path / file.name
+    try:
+        stat = file.stat()
+        if manifest is None:
+            transfer(file, destination)
+        else:
+            if manifest.unchanged(file, stat):
+                logging.debug(f"Skipped unchanged file '{file}'")
+                return 0
+            digest = content_digest(file) if manifest.hashing else None
+            duplicate = manifest.duplicate_of(digest, destination) if digest else None
+            if duplicate is not None:
+                transfer.link_duplicate(file, duplicate, destination)
+            else:
+                transfer(file, destination)
+            manifest.record(file, stat, destination, digest)
+    except OSError as e:
+        logging.error(e)
+        return None
+    logging.debug(f"End handling file '{file}'")
+    return stat.st_size
+
+
+def worker(
+    files: Queue, transfer: Transfer, manifest: Manifest | None, progress: Progress
+) -> None:
+    while True:
+        file = files.get()
+        if file is None:
+            break
+        progress.done(handle_file(file, transfer, manifest))
+
+
+# Fixed number of copying threads fed through a bounded queue, so neither the
+# number of threads nor the memory grows with the size of the tree
+def sort_folder(
+    source_folder: Path,
+    output_folder: Path,
+    workers: int = WORKERS,
+    mode: str = "copy",
+    strategy: str = "auto",
+    manifest: Manifest | None = None,
+) -> Progress:
+    progress = Progress()
+    transfer = Transfer(output_folder, mode, strategy)
+    progress.transfer = transfer
+    progress.manifest = manifest
+    files = Queue(maxsize=QUEUE_SIZE)
+    threads = [
+        Thread(target=worker, args=(files, transfer, manifest, progress))
+        for _ in range(workers)
+    ]
+    [th.start() for th in threads]
+
+    for file in scan_folder(source_folder, output_folder):
+        files.put(file)
+    for _ in threads:
+        files.put(None)
+
+    [th.join() for th in threads]
+    if manifest is not None:
+        manifest.save()
+    return progress
+
+
+# Same work on one event loop: the scanner and every transfer run in worker
+# threads through asyncio.to_thread, a semaphore bounds the transfers in flight
+async def sort_folder_async(
+    source_folder: Path,
+    output_folder: Path,
+    workers: int = WORKERS,
+    mode: str = "copy",
+    strategy: str = "auto",
+    manifest: Manifest | None = None,
+) -> Progress:
+    progress = Progress()
+    transfer = Transfer(output_folder, mode, strategy)
+    progress.transfer = transfer
+    progress.manifest = manifest
+    semaphore = asyncio.Semaphore(workers)
+    tasks = set()
+
+    async def handle(file: Path) -> None:
+        try:
+            progress.done(
+                await asyncio.to_thread(handle_file, file, transfer, manifest)
+            )
+        finally:
+            semaphore.release()
+
+    files = scan_folder(source_folder, output_folder)
+    while batch := await asyncio.to_thread(list, islice(files, QUEUE_SIZE)):
+        for file in batch:
+            await semaphore.acquire()
+            task = asyncio.create_task(handle(file))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+    if manifest is not None:
+        manifest.save()
+    return progress
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App for sorting files in folder")
+    parser.add_argument("-s", "--source", help="Source folder", required=True)
+    parser.add_argument("-o", "--output", help="Output folder")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=WORKERS, help="Copying threads"
+    )
+    parser.add_argument(
+        "-m",
+        "--mode",
+        choices=("copy", "move"),
+        default="copy",
+        help="Keep sources or not",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        choices=ENGINES,
+        default="threads",
+        help="Worker threads or asyncio event loop",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Skip files the output manifest has seen unchanged",
+    )
+    parser.add_argument(
+        "--hash", action="store_true", help="Store content hashes in the manifest"
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Hard-link files whose content is already in the output",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        default="auto",
+        help="How files are transferred",
+    )
+    args = vars(parser.parse_args())
+    source = args.get("source")
+    output = args.get("output")
+
+    source_folder = Path(source)
+    if output:
+        output_folder = Path(output)
+    else:
+        output_folder = Path(f"{source} (sorted)")
+
     timer = time()
     logging.basicConfig(level=logging.DEBUG, format="%(threadName)s %(message)s")
 
-    pool = Semaphore(10)
-
-    thread = Thread(target=parse_folder, args=(source_folder, pool))
-    thread.start()
-    threads.append(thread)
+    manifest = None
+    if args.get("incremental") or args.get("hash") or args.get("dedup"):
+        output_folder.mkdir(exist_ok=True, parents=True)
+        manifest = Manifest(output_folder, args.get("hash"), args.get("dedup"))
 
-    [th.join() for th in threads]
+    options = (
+        source_folder,
+        output_folder,
+        args.get("workers"),
+        args.get("mode"),
+        args.get("strategy"),
+        manifest,
+    )
+    if args.get("engine") == "asyncio":
+        progress = asyncio.run(sort_folder_async(*options))
+    else:
+        progress = sort_folder(*options)
+    logging.info(f"Transfers used: {dict(progress.transfer.used)}")
+    logging.info(f"Throughput: {progress.throughput()}")
+    if manifest is not None:
+        logging.info(f"Unchanged files skipped: {manifest.skipped}")
 
     print(
-        f"Sorting files is finished, folder '{source}' can be deleted\nOperation has taken {round(time() - timer, 4)}s"
+        f"Sorting files is finished, {progress.files} files handled, {progress.errors} errors, folder '{source}' can be deleted\nOperation has taken {round(time() - timer, 4)}s"
     )
@@ -1,70 +1,218 @@
+import argparse
+import asyncio
 import json
 import logging
-import mimetypes
 import socket
 import urllib.parse
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from http.server import HTTPServer, BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime
 from pathlib import Path
-from threading import Thread
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from messages import MessageIndex, parse_query, stream_page
+from static import StaticCache
+from storage import STORAGES, SYNC_EVERY, SYNC_INTERVAL, open_storage
+from transport import TRANSPORTS, client_transport, stream_server
 
 BASE_DIR = Path().joinpath("front-init")
-BUFFER = 1024
+BATCH_SIZE = 500
+BUFFER = 65535
+IDLE_TIMEOUT = 1
+KEEP_ALIVE_TIMEOUT = 5
+LAST_CHUNK = b"0\r\n\r\n"
 M_SERVER_IP = "0.0.0.0"
 M_SERVER_PORT = 3000
+MESSAGE_PATHS = ("/messages", "/messages/users")
+QUEUE_SIZE = 10_000
+RECEIVE_BUFFER = 4 * 1024 * 1024
 S_SERVER_IP = "127.0.0.1"
 S_SERVER_PORT = 5000
+S_SERVER_SOCKET = Path().joinpath("storage/server.sock")
 STATUS_OK = 200
 STATUS_REDIRECT = 302
+STATUS_NOT_MODIFIED = 304
+STATUS_BAD_REQUEST = 400
 STATUS_NOT_FOUND = 404
+STATUS_UNAVAILABLE = 503
 STORAGE = Path().joinpath("storage/data.json")
+SERVERS = ("single", "threads", "asyncio")
+STATS_INTERVAL = 60
+WORKERS = 16
+
+
+ASSETS = StaticCache(BASE_DIR)
+MESSAGES = MessageIndex()
+TRANSPORT = client_transport("udp", (S_SERVER_IP, S_SERVER_PORT))
+
+
+# Cached page or static file answering a GET path, with the status to send it with
+def route(path):
+    match path:
+        case "/":
+            return ASSETS.get(BASE_DIR.joinpath("index.html")), STATUS_OK
+        case "/message.html":
+            return ASSETS.get(BASE_DIR.joinpath("message.html")), STATUS_OK
+        case _:
+            asset = ASSETS.get(BASE_DIR.joinpath(path[1:]))
+            if asset is not None:
+                return asset, STATUS_OK
+            return ASSETS.get(BASE_DIR.joinpath("error.html")), STATUS_NOT_FOUND
+
+
+# Status, headers and body for an asset, 304 without a body when the client
+# already holds the current version
+def asset_response(asset, status_code, accept_encoding, if_none_match):
+    body, etag, encoding = asset.variant(accept_encoding)
+    headers = {
+        "Content-Type": asset.mime_type,
+        "ETag": etag,
+        "Cache-Control": asset.cache_control,
+    }
+    if len(asset.variants) > 1:
+        headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if status_code == STATUS_OK and if_none_match and asset.matches(if_none_match):
+        return STATUS_NOT_MODIFIED, headers, b""
+    return status_code, headers, body
+
+
+# Status, headers and body parts answering a /messages request, the parts are
+# produced while they are sent
+def messages_response(path, query):
+    headers = {"Content-Type": "application/json", "Cache-Control": "no-store"}
+    if path == "/messages/users":
+        return STATUS_OK, headers, [json.dumps({"users": MESSAGES.users()}).encode()]
+    try:
+        filters = parse_query(urllib.parse.parse_qs(query))
+    except ValueError as err:
+        return STATUS_BAD_REQUEST, headers, [json.dumps({"error": str(err)}).encode()]
+    return STATUS_OK, headers, stream_page(*MESSAGES.page(**filters))
+
 
+def encode_chunk(part):
+    return f"{len(part):X}\r\n".encode("latin-1") + part + b"\r\n"
 
+
+# HTTP/1.1 keeps connections open between requests, so every response
+# carries Content-Length and idle clients are dropped after the timeout
 class HTTPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
     def do_POST(self):
         body = self.rfile.read(int(self.headers["Content-Length"]))
-        send_data_to_socket(body)
-        self.send_response(STATUS_REDIRECT)
-        self.send_header("Location", "/message.html")
+        if send_data_to_socket(body):
+            self.send_response(STATUS_REDIRECT)
+            self.send_header("Location", "/message.html")
+        else:
+            self.send_response(STATUS_UNAVAILABLE)
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
     def do_GET(self):
-        route = urllib.parse.urlparse(self.path)
-        match route.path:
-            case "/":
-                self.send_html(BASE_DIR.joinpath("index.html"))
-            case "/message.html":
-                self.send_html(BASE_DIR.joinpath("message.html"))
-            case _:
-                file = BASE_DIR.joinpath(route.path[1:])
-                if file.exists():
-                    self.send_static(file)
-                else:
-                    self.send_html(BASE_DIR.joinpath("error.html"), STATUS_NOT_FOUND)
+        url = urllib.parse.urlparse(self.path)
+        if url.path in MESSAGE_PATHS:
+            self.send_stream(*messages_response(url.path, url.query))
+            return
+        asset, status_code = route(url.path)
+        self.send_asset(asset, status_code)
 
-    def send_html(self, filename, status_code=STATUS_OK):
+    # HTTP/1.1 clients get the parts as chunks over the kept connection,
+    # older ones get them as they are and the connection is closed after
+    def send_stream(self, status_code, headers, parts):
+        chunked = self.request_version == self.protocol_version == "HTTP/1.1"
         self.send_response(status_code)
-        self.send_header("Content-Type", "text/html")
-        self.end_headers()
-        with open(filename, "rb") as file:
-            self.wfile.write(file.read())
-
-    def send_static(self, filename):
-        self.send_response(STATUS_OK)
-        mime_type, *rest = mimetypes.guess_type(filename)
-        if mime_type:
-            self.send_header("Content-Type", mime_type)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
         else:
-            self.send_header("Content-Type", "text/plain")
+            self.close_connection = True
         self.end_headers()
-        with open(filename, "rb") as file:
-            self.wfile.write(file.read())
+        for part in parts:
+            self.wfile.write(encode_chunk(part) if chunked else part)
+        if chunked:
+            self.wfile.write(LAST_CHUNK)
 
+    def send_asset(self, asset, status_code=STATUS_OK):
+        status_code, headers, body = asset_response(
+            asset,
+            status_code,
+            self.headers.get("Accept-Encoding"),
+            self.headers.get("If-None-Match"),
+        )
+        self.send_response(status_code)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status_code != STATUS_NOT_MODIFIED:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+
+# The single-threaded server closes every connection, a kept-alive client
+# would hold it until the timeout
+class ClosingHTTPHandler(HTTPHandler):
+    protocol_version = "HTTP/1.0"
+
+
+# A pool thread serves one connection at a time, so an idle kept-alive
+# client gives it up after IDLE_TIMEOUT, and right after its response when
+# other connections wait for a thread
+class PooledHTTPHandler(HTTPHandler):
+    timeout = IDLE_TIMEOUT
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        if self.server.waiting:
+            self.close_connection = True
+
+
+# ThreadingHTTPServer starts a thread per connection, this one hands the
+# connections to a fixed pool so the worker count stays bounded under load
+class PooledHTTPServer(ThreadingHTTPServer):
+    def __init__(self, server_address, handler, workers=WORKERS):
+        super().__init__(server_address, handler)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+        self.lock = Lock()
+        self.waiting = 0
 
-def run(server=HTTPServer, handler=HTTPHandler):
-    logging.info("Start server")
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.waiting += 1
+        self.pool.submit(self.start_request, request, client_address)
+
+    def start_request(self, request, client_address):
+        with self.lock:
+            self.waiting -= 1
+        self.process_request_thread(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def run(mode="threads", workers=WORKERS):
+    logging.info(f"Start {mode} server")
+    if mode == "asyncio":
+        asyncio.run(run_async(workers))
+        return
     server_address = (M_SERVER_IP, M_SERVER_PORT)
-    http_server = server(server_address, handler)
+    if mode == "threads":
+        http_server = PooledHTTPServer(server_address, PooledHTTPHandler, workers)
+    else:
+        http_server = HTTPServer(server_address, ClosingHTTPHandler)
     try:
         http_server.serve_forever()
     except KeyboardInterrupt:
@@ -72,55 +220,329 @@ def run(server=HTTPServer, handler=HTTPHandler):
         http_server.server_close()
 
 
-def run_socket_server(ip, port):
+def response_head(status_code, headers, keep_alive):
+    lines = [f"HTTP/1.1 {status_code} {HTTPStatus(status_code).phrase}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+# One coroutine per connection serving requests until the client closes it,
+# cache lookups go to the executor so a reload from a slow disk does not
+# stall the loop
+async def handle_connection(reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+            if not request_line:
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            if version == "HTTP/1.1":
+                keep_alive = connection != "close"
+            else:
+                keep_alive = connection == "keep-alive"
+
+            if method == "POST":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                content = b""
+                if await loop.run_in_executor(None, send_data_to_socket, body):
+                    status_code, extra = STATUS_REDIRECT, {"Location": "/message.html"}
+                else:
+                    status_code, extra = STATUS_UNAVAILABLE, {"Retry-After": 1}
+            elif method == "GET":
+                url = urllib.parse.urlparse(target)
+                if url.path in MESSAGE_PATHS:
+                    status_code, extra, content = messages_response(url.path, url.query)
+                else:
+                    asset, status_code = await loop.run_in_executor(
+                        None, route, url.path
+                    )
+                    status_code, extra, content = asset_response(
+                        asset,
+                        status_code,
+                        headers.get("accept-encoding"),
+                        headers.get("if-none-match"),
+                    )
+            else:
+                status_code, content, extra = HTTPStatus.NOT_IMPLEMENTED, b"", {}
+                keep_alive = False
+
+            if isinstance(content, bytes):
+                if status_code != STATUS_NOT_MODIFIED:
+                    extra["Content-Length"] = len(content)
+                writer.write(response_head(status_code, extra, keep_alive) + content)
+            else:
+                chunked = version == "HTTP/1.1"
+                if chunked:
+                    extra["Transfer-Encoding"] = "chunked"
+                else:
+                    keep_alive = False
+                writer.write(response_head(status_code, extra, keep_alive))
+                for part in content:
+                    writer.write(encode_chunk(part) if chunked else part)
+                    await writer.drain()
+                if chunked:
+                    writer.write(LAST_CHUNK)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except asyncio.TimeoutError:
+        logging.debug("Idle connection closed")
+    finally:
+        writer.close()
+
+
+async def run_async(workers=WORKERS):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(workers, thread_name_prefix="io"))
+    server = await asyncio.start_server(
+        handle_connection, M_SERVER_IP, M_SERVER_PORT, backlog=1024
+    )
+    async with server:
+        await server.serve_forever()
+
+
+# The receivers count messages coming in and the writer counts what reached
+# the storage
+class Counters:
+    def __init__(self):
+        self.lock = Lock()
+        self.received = 0
+        self.truncated = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.persisted = 0
+
+    def add(self, name, count=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + count)
+
+    def __str__(self):
+        return ", ".join(
+            f"{name} {value}" for name, value in vars(self).items() if name != "lock"
+        )
+
+
+COUNTERS = Counters()
+STOP = Event()
+
+
+# Runs the writer in its own thread and receives datagrams on the calling one,
+# a full queue drops the message instead of leaving it to overflow the kernel
+# buffer. With a tcp or unix transport framed messages are taken there too
+def run_socket_server(
+    ip,
+    port,
+    storage,
+    buffer_size=BUFFER,
+    receive_buffer=RECEIVE_BUFFER,
+    queue_size=QUEUE_SIZE,
+    batch_size=BATCH_SIZE,
+    transport="udp",
+):
     logging.info("Start socket server")
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    receive_buffer = server_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    logging.info(f"Socket receive buffer {receive_buffer} bytes")
     server = ip, port
     server_socket.bind(server)
+    server_socket.settimeout(SYNC_INTERVAL)
+
+    messages = Queue(queue_size)
+    writer = Thread(
+        target=write_messages,
+        args=(messages, storage, batch_size),
+        name="writer",
+    )
+    writer.start()
+    stream = None
+    if transport != "udp":
+        address = server if transport == "tcp" else S_SERVER_SOCKET
+        stream = stream_server(
+            transport, address, partial(enqueue, messages), buffer_size
+        )
+        Thread(target=stream.serve_forever, name="stream", daemon=True).start()
+        logging.info(f"Listening for {transport} messages on {address}")
     try:
-        while True:
-            data, address = server_socket.recvfrom(BUFFER)
-            save_data(data)
+        receive_messages(server_socket, messages, buffer_size)
     except KeyboardInterrupt:
         logging.info("Socket server stopped")
+    finally:
+        if stream is not None:
+            stream.shutdown()
+            stream.server_close()
         server_socket.close()
+        messages.put(None)
+        writer.join()
+        storage.close()
+        logging.info(f"Messages: {COUNTERS}")
 
 
-def save_data(data):
-    body = urllib.parse.unquote_plus(data.decode())
+# Each datagram is stamped with the time it arrived, MSG_TRUNC tells a
+# datagram longer than the buffer apart from one that exactly fills it
+def receive_messages(server_socket, messages, buffer_size):
+    while not STOP.is_set():
+        try:
+            data, _, flags, address = server_socket.recvmsg(buffer_size)
+        except TimeoutError:
+            continue
+        if flags & socket.MSG_TRUNC:
+            COUNTERS.add("received")
+            COUNTERS.add("truncated")
+            logging.error(f"Dropped datagram over {buffer_size} bytes from {address}")
+            continue
+        enqueue(messages, data)
+
+
+def enqueue(messages, data):
+    COUNTERS.add("received")
     try:
-        payload = {
-            key: value for key, value in [el.split("=", 1) for el in body.split("&", 1)]
-        }
+        messages.put_nowait((str(datetime.now()), data))
+    except Full:
+        COUNTERS.add("dropped")
+        return False
+    return True
 
-        with open(STORAGE, "r", encoding="utf-8") as file:
-            content = json.load(file)
-            content.update({str(datetime.now()): payload})
 
-        with open(STORAGE, "w", encoding="utf-8") as file:
-            json.dump(content, file, ensure_ascii=False)
+# Takes whatever is queued up to batch_size at once and flushes the storage
+# when the queue runs dry, or every SYNC_EVERY messages under steady load
+def write_messages(messages, storage, batch_size):
+    unflushed = 0
+    reported, report = monotonic(), str(COUNTERS)
+    while True:
+        try:
+            item = messages.get(timeout=SYNC_INTERVAL)
+        except Empty:
+            item = ()
+        batch = []
+        while item:
+            key, data = item
+            payload = parse_data(data)
+            if payload is None:
+                COUNTERS.add("invalid")
+            else:
+                batch.append((key, payload))
+            if len(batch) >= batch_size:
+                break
+            try:
+                item = messages.get_nowait()
+            except Empty:
+                item = ()
+
+        if batch:
+            try:
+                storage.save_many(batch)
+                unflushed += len(batch)
+                MESSAGES.add_many(batch)
+            except OSError as err:
+                logging.error(f"Faled write {len(batch)} messages with error: {err}")
+        if unflushed and (messages.empty() or unflushed >= SYNC_EVERY):
+            storage.flush()
+            COUNTERS.add("persisted", unflushed)
+            unflushed = 0
+        if monotonic() - reported >= STATS_INTERVAL and str(COUNTERS) != report:
+            report = str(COUNTERS)
+            logging.info(f"Messages: {report}")
+            reported = monotonic()
+        if item is None:
+            break
 
+
+def parse_data(data):
+    body = urllib.parse.unquote_plus(data.decode())
+    try:
+        return {
+            key: value for key, value in [el.split("=", 1) for el in body.split("&", 1)]
+        }
     except ValueError as err:
         logging.error(f"Faled parse data {body} with error: {err}")
-    except OSError as err:
-        logging.error(f"Faled write data {body} with error: {err}")
 
 
 def send_data_to_socket(body):
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    client_socket.sendto(body, (S_SERVER_IP, S_SERVER_PORT))
-    client_socket.close()
+    return TRANSPORT.send(body)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Web application with a socket storage server"
+    )
+    parser.add_argument(
+        "-m", "--mode", choices=SERVERS, default="threads", help="HTTP server"
+    )
+    parser.add_argument(
+        "-s", "--storage", choices=STORAGES, default="log", help="Message storage"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=WORKERS, help="HTTP worker threads"
+    )
+    parser.add_argument(
+        "-t",
+        "--transport",
+        choices=TRANSPORTS,
+        default="udp",
+        help="Channel from the HTTP server to the socket server",
+    )
+    parser.add_argument(
+        "--buffer", type=int, default=BUFFER, help="Largest datagram in bytes"
+    )
+    parser.add_argument(
+        "--rcvbuf", type=int, default=RECEIVE_BUFFER, help="Socket receive buffer"
+    )
+    parser.add_argument(
+        "--queue", type=int, default=QUEUE_SIZE, help="Messages waiting for storage"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=BATCH_SIZE, help="Messages saved at once"
+    )
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.INFO, format="%(threadName)s %(message)s")
 
     if not STORAGE.exists():
         with open(STORAGE, "w", encoding="utf-8") as file:
             json.dump({}, file, ensure_ascii=False)
 
-    thread_server = Thread(target=run)
+    ASSETS.preload()
+    storage = open_storage(args.storage, STORAGE)
+    MESSAGES.add_many(storage.items())
+    if args.transport == "tcp":
+        TRANSPORT = client_transport("tcp", (S_SERVER_IP, S_SERVER_PORT))
+    elif args.transport == "unix":
+        TRANSPORT = client_transport("unix", S_SERVER_SOCKET)
+
+    thread_server = Thread(target=run, args=(args.mode, args.workers), daemon=True)
     thread_server.start()
 
-    thread_socket = Thread(target=run_socket_server, args=(S_SERVER_IP, S_SERVER_PORT))
+    thread_socket = Thread(
+        target=run_socket_server,
+        args=(
+            S_SERVER_IP,
+            S_SERVER_PORT,
+            storage,
+            args.buffer,
+            args.rcvbuf,
+            args.queue,
+            args.batch,
+            args.transport,
+        ),
+    )
     thread_socket.start()
+
+    # Worker pools refuse new tasks once the main thread has finished, and
+    # Ctrl+C only reaches the main thread, which lets the writer drain and
+    # close the storage before exiting
+    try:
+        thread_server.join()
+    except KeyboardInterrupt:
+        STOP.set()
+        thread_socket.join()
@@ -0,0 +1,56 @@
+import argparse
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+from storage import STORAGES, open_storage
+
+TARGET = 10_000
+
+
+def messages(count: int) -> list[tuple[str, dict]]:
+    start = datetime.now()
+    return [
+        (
+            str(start + timedelta(microseconds=i)),
+            {"username": f"user{i % 100}", "message": f"Message number {i} " * 4},
+        )
+        for i in range(count)
+    ]
+
+
+# Messages arrive in batches the way the socket server's writer hands them over
+def run(kind: str, count: int, batch: int) -> float:
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "data.json"
+        storage = open_storage(kind, path)
+        data = messages(count)
+        timer = perf_counter()
+        for i in range(0, count, batch):
+            storage.save_many(data[i : i + batch])
+        storage.flush()
+        elapsed = perf_counter() - timer
+        storage.close()
+    return count / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message storage throughput")
+    parser.add_argument("-n", "--count", type=int, default=100_000)
+    parser.add_argument("-b", "--batch", type=int, default=1)
+    parser.add_argument(
+        "--json-count",
+        type=int,
+        default=1000,
+        help="Messages for the whole-file JSON storage, it is quadratic",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for kind in STORAGES:
+        count = args.json_count if kind == "json" else args.count
+        rate = run(kind, count, args.batch)
+        verdict = "ok" if rate >= TARGET else f"below {TARGET}"
+        logging.info(f"{kind:7} {count:8} messages {rate:10.0f} msgs/s  {verdict}")
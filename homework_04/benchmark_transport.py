@@ -0,0 +1,93 @@
+import argparse
+import http.client
+import json
+import logging
+import signal
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter, sleep
+
+from transport import TRANSPORTS
+
+APP = Path(__file__).resolve().parent
+
+
+# Posts the form over one kept-alive connection, counting what the server
+# refused with 503 or lost on the way
+def client(port: int, requests: int, offset: int) -> tuple[int, int]:
+    accepted = failed = 0
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for i in range(requests):
+        body = f"username=load{offset}&message=Message+{offset}+{i}"
+        try:
+            connection.request(
+                "POST",
+                "/",
+                body,
+                {"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            failed += 1
+            continue
+        if response.status == 302:
+            accepted += 1
+        else:
+            failed += 1
+    connection.close()
+    return accepted, failed
+
+
+# The application runs in a scratch folder so the benchmark never touches
+# storage/data.json, and is stopped with Ctrl+C so the writer drains first
+def run(transport: str, clients: int, requests: int, storage: str) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        (Path(folder) / "storage").mkdir()
+        (Path(folder) / "front-init").symlink_to(APP / "front-init")
+        app = subprocess.Popen(
+            [sys.executable, str(APP / "app.py"), "-t", transport, "-s", storage],
+            cwd=folder,
+            stderr=subprocess.DEVNULL,
+        )
+        sleep(1)
+        per_client = max(1, requests // clients)
+        timer = perf_counter()
+        with ThreadPoolExecutor(clients) as executor:
+            results = list(
+                executor.map(
+                    lambda i: client(3000, per_client, i * per_client),
+                    range(clients),
+                )
+            )
+        elapsed = perf_counter() - timer
+        app.send_signal(signal.SIGINT)
+        app.wait(timeout=30)
+
+        with open(Path(folder) / "storage" / "data.json", encoding="utf-8") as file:
+            stored = len(json.load(file))
+
+    sent = per_client * clients
+    accepted = sum(accepted for accepted, _ in results)
+    failed = sum(failed for _, failed in results)
+    logging.info(
+        f"{transport:5} {sent / elapsed:8.0f} POST/s"
+        f"  accepted {accepted}  refused {failed}"
+        f"  stored {stored}  lost {(accepted - stored) / max(accepted, 1):.2%}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POST throughput per transport")
+    parser.add_argument("-c", "--clients", type=int, default=20, help="Connections")
+    parser.add_argument("-n", "--requests", type=int, default=20_000)
+    parser.add_argument("-t", "--transport", choices=TRANSPORTS, nargs="*")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for transport in args.transport or TRANSPORTS:
+        run(transport, args.clients, args.requests, "log")
@@ -0,0 +1,71 @@
+import argparse
+import http.client
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+PATHS = ("/", "/message.html", "/style.css", "/logo.png")
+
+
+# Each client keeps one connection open and sends its share of the requests
+# over it, reconnecting only when the server closes the connection
+def client(host: str, port: int, path: str, requests: int) -> tuple[list[float], int]:
+    latencies = []
+    errors = 0
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    for _ in range(requests):
+        started = perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            if response.will_close:
+                connection.close()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            errors += 1
+            continue
+        latencies.append(perf_counter() - started)
+    connection.close()
+    return latencies, errors
+
+
+def percentile(values: list[float], share: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def load(host: str, port: int, path: str, clients: int, requests: int) -> None:
+    per_client = max(1, requests // clients)
+    timer = perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        results = list(
+            executor.map(lambda _: client(host, port, path, per_client), range(clients))
+        )
+    elapsed = perf_counter() - timer
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(errors for _, errors in results)
+    if not latencies:
+        logging.info(f"{path:15} all {errors} requests failed")
+        return
+    logging.info(
+        f"{path:15} {len(latencies) / elapsed:8.0f} req/s"
+        f"  p50 {percentile(latencies, 0.5) * 1000:6.2f} ms"
+        f"  p99 {percentile(latencies, 0.99) * 1000:6.2f} ms"
+        f"  errors {errors}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test for the web application")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("-c", "--clients", type=int, default=50, help="Connections")
+    parser.add_argument("-n", "--requests", type=int, default=5000, help="Per path")
+    parser.add_argument("paths", nargs="*", default=PATHS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    logging.info(f"{args.clients} clients, {args.requests} requests per path")
+    for path in args.paths:
+        load(args.host, args.port, path, args.clients, args.requests)
@@ -0,0 +1,98 @@
+import json
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from threading import Lock
+
+MAX_PAGE_SIZE = 1000
+PAGE_SIZE = 100
+STREAM_BATCH = 100
+
+
+# Message times in receiving order, kept sorted for the whole history and per
+# username. Keys are str(datetime.now()) so they sort as text, messages almost
+# always come in order and are appended, the rest is inserted with bisect
+class MessageIndex:
+    def __init__(self):
+        self.lock = Lock()
+        self.keys = []
+        self.payloads = {}
+        self.by_user = {}
+
+    def add_many(self, messages):
+        with self.lock:
+            for key, payload in messages:
+                known = key in self.payloads
+                self.payloads[key] = payload
+                if known:
+                    continue
+                add_sorted(self.keys, key)
+                add_sorted(self.by_user.setdefault(payload.get("username"), []), key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Up to limit messages with since <= time < until after the cursor, and
+    # the cursor of the next page when there is one
+    def page(self, since=None, until=None, username=None, cursor=None, limit=PAGE_SIZE):
+        with self.lock:
+            keys = self.keys if username is None else self.by_user.get(username, [])
+            start = bisect_left(keys, since) if since else 0
+            if cursor:
+                start = max(start, bisect_right(keys, cursor))
+            end = bisect_left(keys, until) if until else len(keys)
+            selected = keys[start : min(end, start + limit)]
+            items = [(key, self.payloads[key]) for key in selected]
+        if selected and start + limit < end:
+            return items, selected[-1]
+        return items, None
+
+    def users(self):
+        with self.lock:
+            return {
+                username: len(keys)
+                for username, keys in self.by_user.items()
+                if username is not None
+            }
+
+
+def add_sorted(keys, key):
+    if not keys or keys[-1] < key:
+        keys.append(key)
+    else:
+        insort(keys, key)
+
+
+# Times are accepted in ISO format and turned into the key format
+def parse_time(value):
+    if not value:
+        return None
+    return str(datetime.fromisoformat(value))
+
+
+# Filters of a /messages query string, ValueError for anything malformed
+def parse_query(query):
+    limit = int(query.get("limit", [PAGE_SIZE])[0])
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return {
+        "since": parse_time(query.get("since", [None])[0]),
+        "until": parse_time(query.get("until", [None])[0]),
+        "username": query.get("username", [None])[0],
+        "cursor": query.get("cursor", [None])[0],
+        "limit": limit,
+    }
+
+
+# The page is encoded and sent STREAM_BATCH messages at a time, so a large
+# page never sits in memory as a single string. The key wins over a posted
+# "time" field
+def stream_page(items, cursor):
+    yield b'{"messages": ['
+    for i in range(0, len(items), STREAM_BATCH):
+        batch = items[i : i + STREAM_BATCH]
+        part = ", ".join(
+            json.dumps({**payload, "time": key}, ensure_ascii=False)
+            for key, payload in batch
+        )
+        yield (", " + part if i else part).encode("utf-8")
+    yield f'], "next": {json.dumps(cursor)}}}'.encode("utf-8")
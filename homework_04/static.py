@@ -0,0 +1,120 @@
+import gzip
+import mimetypes
+import os
+import stat as file_stat
+from hashlib import blake2b
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CHECK_INTERVAL = 1.0
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg")
+MAX_AGE = 3600
+MAX_ASSETS = 1000
+
+
+def content_type(filename):
+    mime_type, *rest = mimetypes.guess_type(filename)
+    return mime_type or "text/plain"
+
+
+# A file of the front-end kept in memory with everything a response needs,
+# the compressed variants are only kept when they are smaller
+class Asset:
+    __slots__ = ("path", "mtime", "mime_type", "cache_control", "variants", "checked")
+
+    def __init__(self, path, stat, content):
+        self.path = path
+        self.mtime = stat.st_mtime_ns
+        self.mime_type = content_type(path)
+        if self.mime_type == "text/html":
+            self.cache_control = "no-cache"
+        else:
+            self.cache_control = f"public, max-age={MAX_AGE}"
+        tag = blake2b(content, digest_size=8).hexdigest()
+        self.variants = {None: (content, f'"{tag}"')}
+        if self.mime_type.startswith(COMPRESSIBLE):
+            encoded = {"gzip": gzip.compress(content, mtime=0)}
+            if brotli is not None:
+                encoded["br"] = brotli.compress(content)
+            for encoding, body in encoded.items():
+                if len(body) < len(content):
+                    self.variants[encoding] = (body, f'"{tag}-{encoding}"')
+        self.checked = monotonic()
+
+    # Body, ETag and Content-Encoding for the client's Accept-Encoding
+    def variant(self, accept_encoding):
+        accepted = {
+            token.split(";")[0].strip()
+            for token in (accept_encoding or "").split(",")
+            if "q=0" not in token.replace(" ", "").split(";")[1:]
+        }
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return (*self.variants[encoding], encoding)
+        return (*self.variants[None], None)
+
+    def matches(self, if_none_match):
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or any(etag in tags for _, etag in self.variants.values())
+
+
+# Files are read once and served from memory, a file is stat'ed again at most
+# once per CHECK_INTERVAL and reloaded when its mtime changed. Paths outside
+# the folder are never served. Assets are kept by their resolved path, a hit
+# only normalizes the requested path and finds what it resolved to last time,
+# the disk is asked on a miss or a recheck. Past MAX_ASSETS the oldest loaded
+# entries are dropped
+class StaticCache:
+    def __init__(self, folder):
+        self.root = Path(folder)
+        self.folder = self.root.resolve()
+        self.assets = {}
+        self.paths = {}
+        self.lock = Lock()
+
+    def preload(self):
+        for path in self.root.rglob("*"):
+            if path.is_file():
+                self.get(path)
+        return self
+
+    def get(self, path):
+        key = os.path.normpath(path)
+        resolved = self.paths.get(key)
+        asset = self.assets.get(resolved)
+        if asset is not None and monotonic() - asset.checked < CHECK_INTERVAL:
+            return asset
+        try:
+            resolved = Path(key).resolve(strict=True)
+            stat = os.stat(resolved)
+        except (OSError, RuntimeError):
+            stat = None
+        if (
+            stat is None
+            or not file_stat.S_ISREG(stat.st_mode)
+            or not resolved.is_relative_to(self.folder)
+        ):
+            with self.lock:
+                self.paths.pop(key, None)
+            return None
+        asset = self.assets.get(resolved)
+        if asset is not None and asset.mtime == stat.st_mtime_ns:
+            asset.checked = monotonic()
+        else:
+            with self.lock:
+                with open(resolved, "rb") as file:
+                    asset = Asset(resolved, os.fstat(file.fileno()), file.read())
+                self.assets[resolved] = asset
+                if len(self.assets) > MAX_ASSETS:
+                    del self.assets[next(iter(self.assets))]
+        with self.lock:
+            self.paths[key] = resolved
+            if len(self.paths) > MAX_ASSETS:
+                del self.paths[next(iter(self.paths))]
+        return asset
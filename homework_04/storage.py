@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from time import monotonic
+
+COMPACT_EVERY = 100_000
+SYNC_EVERY = 1000
+SYNC_INTERVAL = 0.1
+
+
+# Every storage keeps messages as {received time: payload} like data.json and
+# is written by one thread, flush() makes everything saved so far durable.
+# This one reads and rewrites the whole data.json for every save
+class JSONStorage:
+    def __init__(self, path):
+        self.path = Path(path)
+        if not self.path.exists():
+            write_json(self.path, {})
+
+    def save(self, key, payload):
+        self.save_many([(key, payload)])
+
+    def save_many(self, messages):
+        content = read_json(self.path)
+        content.update(messages)
+        write_json(self.path, content)
+
+    def items(self):
+        return read_json(self.path).items()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Messages are appended to data.jsonl, one {key: payload} object per line.
+# The log is fsync'ed every SYNC_EVERY messages or SYNC_INTERVAL seconds and
+# folded into data.json every COMPACT_EVERY messages, on start and on close,
+# so data.json keeps its format for anything reading it directly
+class LogStorage:
+    def __init__(self, path, compact_every=COMPACT_EVERY):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".jsonl")
+        self.compact_every = compact_every
+        self.log = open(self.log_path, "a+", encoding="utf-8")
+        self.pending = 0
+        self.appended = 0
+        self.synced = monotonic()
+        self.compact()
+
+    def save(self, key, payload):
+        self.save_many([(key, payload)])
+
+    def save_many(self, messages):
+        for key, payload in messages:
+            self.log.write(json.dumps({key: payload}, ensure_ascii=False) + "\n")
+            self.pending += 1
+            self.appended += 1
+        if self.pending >= SYNC_EVERY or monotonic() - self.synced >= SYNC_INTERVAL:
+            self.flush()
+        if self.appended >= self.compact_every:
+            self.compact()
+
+    def flush(self):
+        if self.pending:
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.pending = 0
+        self.synced = monotonic()
+
+    def items(self):
+        return self.read().items()
+
+    def read(self):
+        self.flush()
+        content = read_json(self.path)
+        self.log.seek(0)
+        for line in self.log:
+            try:
+                content.update(json.loads(line))
+            except ValueError:
+                logging.error(f"Skipped broken log line {line!r}")
+        return content
+
+    def compact(self):
+        content = self.read()
+        # Replaying the log again after a crash right here only rewrites the
+        # same keys, so data.json is replaced before the log is emptied
+        write_json(self.path, content)
+        self.log.truncate(0)
+        os.fsync(self.log.fileno())
+        self.appended = 0
+
+    def close(self):
+        self.compact()
+        self.log.close()
+
+
+# Messages are rows of data.db indexed by time and by username
+class SQLiteStorage:
+    def __init__(self, path):
+        self.path = Path(path).with_suffix(".db")
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS messages (
+                received TEXT PRIMARY KEY,
+                username TEXT,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_username
+                ON messages (username, received);
+            """
+        )
+        self.pending = 0
+        self.synced = monotonic()
+
+    def save(self, key, payload):
+        self.save_many([(key, payload)])
+
+    def save_many(self, messages):
+        rows = [
+            (key, payload.get("username"), json.dumps(payload, ensure_ascii=False))
+            for key, payload in messages
+        ]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?)", rows
+        )
+        self.pending += len(rows)
+        if self.pending >= SYNC_EVERY or monotonic() - self.synced >= SYNC_INTERVAL:
+            self.flush()
+
+    def items(self):
+        rows = self.connection.execute(
+            "SELECT received, payload FROM messages ORDER BY received"
+        )
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def flush(self):
+        self.connection.commit()
+        self.pending = 0
+        self.synced = monotonic()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+STORAGES = {"json": JSONStorage, "log": LogStorage, "sqlite": SQLiteStorage}
+
+
+def read_json(path):
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+# A reader never sees a half-written data.json
+def write_json(path, content):
+    temp = path.with_suffix(".tmp")
+    with open(temp, "w", encoding="utf-8") as file:
+        json.dump(content, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+
+
+def open_storage(kind, path):
+    return STORAGES[kind](path)
@@ -0,0 +1,122 @@
+import logging
+import socket
+import socketserver
+from pathlib import Path
+from threading import local
+
+ACK = b"\x01"
+NACK = b"\x00"
+HEADER_SIZE = 4
+SEND_TIMEOUT = 2
+TRANSPORTS = ("udp", "tcp", "unix")
+
+
+# One socket per thread of the HTTP server, opened on the first message and
+# kept for the rest of the worker's life. Datagrams are fire and forget
+class UDPTransport:
+    def __init__(self, address):
+        self.address = address
+        self.local = local()
+
+    def connection(self):
+        client_socket = getattr(self.local, "socket", None)
+        if client_socket is None:
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.local.socket = client_socket
+        return client_socket
+
+    def send(self, body):
+        try:
+            self.connection().sendto(body, self.address)
+        except OSError as err:
+            logging.error(f"Failed to send message with error: {err}")
+            return False
+        return True
+
+
+# Messages go over a kept connection as a 4-byte big-endian length and the
+# body, the server answers every one with ACK once it took the message or
+# NACK when it had no room. A broken or silent connection is reopened once per
+# message, so a message whose ACK was lost can be stored twice. A storage that
+# does not answer within SEND_TIMEOUT fails the message instead of hanging
+class StreamTransport(UDPTransport):
+    def __init__(self, address, family=socket.AF_INET):
+        super().__init__(address)
+        self.family = family
+
+    def connection(self):
+        client_socket = getattr(self.local, "socket", None)
+        if client_socket is None:
+            client_socket = socket.socket(self.family, socket.SOCK_STREAM)
+            client_socket.settimeout(SEND_TIMEOUT)
+            if self.family == socket.AF_INET:
+                client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_socket.connect(self.address)
+            self.local.socket = client_socket
+        return client_socket
+
+    def send(self, body):
+        frame = len(body).to_bytes(HEADER_SIZE, "big") + body
+        for attempt in range(2):
+            client_socket = None
+            try:
+                client_socket = self.connection()
+                client_socket.sendall(frame)
+                answer = client_socket.recv(1)
+            except OSError as err:
+                answer, error = b"", err
+            else:
+                error = "connection closed"
+            if answer:
+                return answer == ACK
+            self.local.socket = None
+            if client_socket is not None:
+                client_socket.close()
+        logging.error(f"Failed to send message with error: {error}")
+        return False
+
+
+class StreamHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            header = self.rfile.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                break
+            size = int.from_bytes(header, "big")
+            if size > self.server.max_size:
+                logging.error(f"Closed connection sending {size} bytes")
+                break
+            data = self.rfile.read(size)
+            if len(data) < size:
+                break
+            self.wfile.write(ACK if self.server.accept(data) else NACK)
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+# Listens for framed messages on a TCP address or a Unix socket path and
+# hands each of them to accept, which tells whether it was taken
+def stream_server(transport, address, accept, max_size):
+    if transport == "tcp":
+        stream = TCPServer(address, StreamHandler)
+    else:
+        Path(address).unlink(missing_ok=True)
+        stream = UnixServer(str(address), StreamHandler)
+    stream.accept = accept
+    stream.max_size = max_size
+    return stream
+
+
+def client_transport(transport, address):
+    if transport == "udp":
+        return UDPTransport(address)
+    if transport == "tcp":
+        return StreamTransport(address)
+    return StreamTransport(str(address), socket.AF_UNIX)
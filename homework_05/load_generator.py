@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+URI = "ws://localhost:8080"
+CONNECT_AT_ONCE = 100
+SLOW_CLIENT_CODE = 1013
+
+
+class Stats:
+    def __init__(self):
+        self.connections = []
+        self.connected = 0
+        self.failed = 0
+        self.closed = 0
+        self.received = 0
+        self.latencies = []
+
+
+# Every broadcast of the sender ends with the time it was sent, a slow client
+# sleeps after each message so its outbox on the server fills up. Clients read
+# until run closes them
+async def client(uri: str, slow: bool, delay: float, stats: Stats):
+    try:
+        ws = await websockets.connect(uri, open_timeout=60, max_queue=1)
+    except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+        stats.failed += 1
+        return
+    stats.connected += 1
+    stats.connections.append(ws)
+    try:
+        async for message in ws:
+            *_, sent = message.rsplit(" ", 1)
+            stats.received += 1
+            stats.latencies.append(time.time() - float(sent))
+            if slow:
+                await asyncio.sleep(delay)
+    except ConnectionClosed:
+        pass
+    if ws.close_code == SLOW_CLIENT_CODE:
+        stats.closed += 1
+
+
+# Clients connect in waves so the listen backlog of the server never overflows
+async def connect_all(uri, count, slow_share, delay, stats):
+    tasks = []
+    for i in range(count):
+        slow = random.random() < slow_share
+        tasks.append(asyncio.create_task(client(uri, slow, delay, stats)))
+        if len(tasks) % CONNECT_AT_ONCE == 0 or len(tasks) == count:
+            while stats.connected + stats.failed < len(tasks):
+                await asyncio.sleep(0.01)
+    return tasks
+
+
+async def run(uri, clients, messages, rate, slow_share, delay, size):
+    stats = Stats()
+    timer = time.perf_counter()
+    tasks = await connect_all(uri, clients, slow_share, delay, stats)
+    logging.info(
+        f"{stats.connected} clients connected, {stats.failed} failed"
+        f" in {time.perf_counter() - timer:.1f} s"
+    )
+
+    async with websockets.connect(uri) as sender:
+        for i in range(messages):
+            await sender.send(f"bench {i} {'x' * size} {time.time()}")
+            await asyncio.sleep(1 / rate)
+        await asyncio.sleep(2)
+    await asyncio.gather(*(ws.close() for ws in stats.connections))
+    await asyncio.gather(*tasks)
+
+    expected = messages * stats.connected
+    latencies = sorted(stats.latencies)
+    logging.info(
+        f"{messages} broadcasts, {stats.received} of {expected} deliveries"
+        f" ({stats.received / max(expected, 1):.1%}),"
+        f" {stats.closed} clients closed by the server"
+    )
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        logging.info(
+            f"End-to-end latency p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms,"
+            f" max {latencies[-1] * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Connects many clients to the server")
+    parser.add_argument("--uri", default=URI)
+    parser.add_argument("-c", "--clients", type=int, default=5000)
+    parser.add_argument("-m", "--messages", type=int, default=50)
+    parser.add_argument("-r", "--rate", type=float, default=10, help="Messages/s")
+    parser.add_argument(
+        "--slow", type=float, default=0.01, help="Share of slow clients"
+    )
+    parser.add_argument("--delay", type=float, default=1, help="Slow client pause")
+    parser.add_argument("--size", type=int, default=0, help="Message padding")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(
+        run(
+            args.uri,
+            args.clients,
+            args.messages,
+            args.rate,
+            args.slow,
+            args.delay,
+            args.size,
+        )
+    )
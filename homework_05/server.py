@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import logging
 
@@ -6,34 +7,155 @@ import websockets
 
 from utility import MAX_DAYS, MIN_DAYS, parser
 
+from collections import deque
 from datetime import datetime
+from time import perf_counter
 
 from aiofile import async_open
 from websockets import WebSocketServerProtocol, WebSocketProtocolError
-from websockets.exceptions import ConnectionClosedOK
+from websockets.exceptions import ConnectionClosed
+
+LATENCY_WINDOW = 100_000
+METRICS_INTERVAL = 10
+OUTBOX_SIZE = 100
+POLICIES = ("drop", "disconnect")
+SLOW_CLIENT_CODE = 1013
+WRITE_LIMIT = 2**16
+
+
+class FanOutMetrics:
+    """
+    Broadcast counters, how long each broadcast took to write to the ready
+    clients and how long queued messages waited until client.send returned,
+    over the last LATENCY_WINDOW of each
+    """
+
+    def __init__(self):
+        self.broadcasts = 0
+        self.delivered = 0
+        self.queued = 0
+        self.dropped = 0
+        self.disconnected = 0
+        self.broadcast_times = deque(maxlen=LATENCY_WINDOW)
+        self.queued_times = deque(maxlen=LATENCY_WINDOW)
+
+    def __str__(self):
+        report = (
+            f"broadcasts {self.broadcasts}, delivered {self.delivered}, "
+            f"queued {self.queued}, dropped {self.dropped}, "
+            f"disconnected {self.disconnected}"
+        )
+        for name, times in (
+            ("broadcast", self.broadcast_times),
+            ("queued delivery", self.queued_times),
+        ):
+            if times:
+                times = sorted(times)
+                p50 = times[len(times) // 2]
+                p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+                report += (
+                    f", {name} p50 {p50 * 1000:.2f} ms,"
+                    f" p99 {p99 * 1000:.2f} ms, max {times[-1] * 1000:.2f} ms"
+                )
+        return report
 
 
 class Server:
+    """
+    A broadcast is written at once to every client that keeps up, the others
+    get it through a bounded outbox drained by their own task, so a slow
+    client delays nobody else. A client whose outbox is full loses the
+    message ("drop") or is closed ("disconnect")
+    """
+
     clients = set()
 
+    def __init__(self, policy: str = "drop", outbox_size: int = OUTBOX_SIZE):
+        self.policy = policy
+        self.outbox_size = outbox_size
+        self.outboxes = {}
+        self.senders = {}
+        self.sending = set()
+        self.tasks = set()
+        self.metrics = FanOutMetrics()
+
     async def register(self, ws: WebSocketServerProtocol):
         ws.name = names.get_full_name()
         self.clients.add(ws)
+        outbox = asyncio.Queue(self.outbox_size)
+        self.outboxes[ws] = outbox
+        self.senders[ws] = asyncio.create_task(self.deliver(ws, outbox))
         logging.info(f"{ws.remote_address} connects")
 
     async def unregister(self, ws: WebSocketServerProtocol):
         self.clients.remove(ws)
+        self.outboxes.pop(ws, None)
+        self.senders.pop(ws).cancel()
         logging.info(f"{ws.remote_address} disconnects")
 
+    # Keeps a reference to a background task until it is done
+    def start(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def deliver(self, ws: WebSocketServerProtocol, outbox: asyncio.Queue):
+        while True:
+            message, queued = await outbox.get()
+            self.sending.add(ws)
+            try:
+                await ws.send(message)
+            except ConnectionClosed:
+                return
+            finally:
+                self.sending.discard(ws)
+            self.metrics.delivered += 1
+            self.metrics.queued_times.append(perf_counter() - queued)
+
+    # A client is ready when nothing of it is queued or being sent and its
+    # write buffer is under the limit, so messages never overtake each other
+    def ready(self, ws: WebSocketServerProtocol, outbox: asyncio.Queue) -> bool:
+        return (
+            outbox.empty()
+            and ws not in self.sending
+            and ws.transport.get_write_buffer_size() < WRITE_LIMIT
+        )
+
     async def send_to_clients(self, message: str):
-        if self.clients:
-            [await client.send(message) for client in self.clients]
+        started = perf_counter()
+        self.metrics.broadcasts += 1
+        ready = []
+        for ws, outbox in list(self.outboxes.items()):
+            if self.ready(ws, outbox):
+                ready.append(ws)
+                continue
+            try:
+                outbox.put_nowait((message, started))
+                self.metrics.queued += 1
+            except asyncio.QueueFull:
+                if self.policy == "disconnect":
+                    self.metrics.disconnected += 1
+                    self.outboxes.pop(ws, None)
+                    self.start(ws.close(SLOW_CLIENT_CODE, "Too slow"))
+                else:
+                    self.metrics.dropped += 1
+        websockets.broadcast(ready, message)
+        self.metrics.delivered += len(ready)
+        self.metrics.broadcast_times.append(perf_counter() - started)
+
+    async def report(self, interval: float = METRICS_INTERVAL):
+        reported = None
+        while True:
+            await asyncio.sleep(interval)
+            if self.metrics.broadcasts != reported:
+                reported = self.metrics.broadcasts
+                logging.info(f"Clients {len(self.clients)}, {self.metrics}")
 
     async def ws_handler(self, ws: WebSocketServerProtocol):
         await self.register(ws)
         try:
             await self.distrubute(ws)
-        except ConnectionClosedOK:
+        except ConnectionClosed:
             pass
         finally:
             await self.unregister(ws)
@@ -74,15 +196,24 @@ class Server:
             await file.write(f"{now}\n")
 
 
-async def main():
-    server = Server()
+async def main(policy: str = "drop", outbox_size: int = OUTBOX_SIZE):
+    server = Server(policy, outbox_size)
     async with websockets.serve(server.ws_handler, "localhost", 8080):
-        await asyncio.Future()  # run forever
+        await server.report()  # run forever
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Chat and exchange rates server")
+    arg_parser.add_argument(
+        "-p", "--policy", choices=POLICIES, default="drop", help="Slow clients"
+    )
+    arg_parser.add_argument(
+        "-o", "--outbox", type=int, default=OUTBOX_SIZE, help="Messages per client"
+    )
+    args = arg_parser.parse_args()
+
     logging.basicConfig(level=logging.INFO)
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.policy, args.outbox))
     except KeyboardInterrupt as err:
         print("Server stopped")